@@ -1,47 +1,96 @@
-from flask import Flask
-from config import Config
-from models import db
+"""
+Flask-приложение "Электронная библиотека".
+Маршруты собраны в blueprint `main`, приложение создаётся фабрикой create_app().
+"""
+
+import os
+from flask import Flask, Blueprint, current_app
+from flask import render_template, redirect, url_for, flash, request, abort, send_from_directory, jsonify
 from flask_login import LoginManager
-from flask import render_template, redirect, url_for, flash, request, abort, send_from_directory
 from flask_login import login_user, logout_user, login_required, current_user
-from models import db, User, Role, Book, Genre, Cover, Review, ReviewStatus, Collection
-from forms import LoginForm, BookForm, ReviewForm, RegisterForm
-from werkzeug.security import check_password_hash, generate_password_hash
-import os, hashlib, markdown, bleach
-from sqlalchemy import func
 from flask_migrate import Migrate
-from flask_wtf import FlaskForm
-from wtforms import StringField, SelectField, SubmitField, PasswordField
-from wtforms.validators import DataRequired, Length
-
-app = Flask(__name__)
-app.config.from_object(Config)
-db.init_app(app)
-migrate = Migrate(app, db)
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import func, and_, or_
+from sqlalchemy.orm import selectinload
+from config import Config
+from models import db, User, Role, Book, Genre, Review, ReviewStatus, Collection, OutboxEvent
+from forms import LoginForm, BookForm, ReviewForm, RegisterForm, UserEditForm, UserAddForm
+from suggest import SuggestIndex
+from covers import store_cover, release_cover, PhashIndex
+import outbox
+from fragments import FragmentCache, book_card
+from passwords import PasswordHasher, PasswordHasherBusy, LoginRateLimiter
+from compression import compress_response, precompressed_static
+
+migrate = Migrate()
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
+
+bp = Blueprint('main', __name__)
+
+
+def create_app(config_object=Config, **overrides):
+    """Создаёт и настраивает экземпляр Flask-приложения.
+
+    Тяжёлые модули (markdown, bleach) импортируются лениво при первом использовании,
+    поэтому фабрика быстро отрабатывает в pre-fork воркерах и в тестах.
+    """
+    from commands import register_commands
+
+    app = Flask(__name__)
+    app.config.from_object(config_object)
+    app.config.update(overrides)
+    bytecode_dir = app.config['JINJA_BYTECODE_CACHE_DIR'] or os.path.join(app.instance_path, 'jinja_cache')
+    os.makedirs(bytecode_dir, exist_ok=True)
+    app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache(bytecode_dir))
+    app.jinja_env.globals['book_card'] = book_card
+    db.init_app(app)
+    migrate.init_app(app, db)
+    login_manager.init_app(app)
+    app.extensions['suggest_index'] = SuggestIndex()
+    app.extensions['fragment_cache'] = FragmentCache(app.config['FRAGMENT_CACHE_SIZE'])
+    app.extensions['phash_index'] = PhashIndex()
+    app.extensions['password_hasher'] = PasswordHasher(
+        app.config['PASSWORD_HASH_METHOD'],
+        app.config['PASSWORD_HASH_WORKERS'],
+        app.config['PASSWORD_HASH_QUEUE'],
+        app.config['PASSWORD_HASH_TIMEOUT']
+    )
+    app.extensions['login_limiter'] = LoginRateLimiter(
+        app.config['RATE_LIMIT_DB'] or os.path.join(app.instance_path, 'ratelimit.db'),
+        app.config['LOGIN_RATE_WINDOW']
+    )
+    app.register_blueprint(bp)
+    if app.config['SUGGEST_INDEX_PRELOAD']:
+        with app.app_context():
+            # Индекс строится при старте воркера; пока схема не обновлена (flask db upgrade), — при первом запросе
+            inspector = db.inspect(db.engine)
+            if all(inspector.has_table(model.__tablename__) for model in (Book, OutboxEvent)):
+                build_suggest_index(app.extensions['suggest_index'])
+    app.view_functions['static'] = precompressed_static
+    app.after_request(compress_response)
+    register_commands(app)
+    return app
 
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
 
 @login_manager.unauthorized_handler
 def custom_unauthorized():
     flash('Для выполнения данного действия необходимо пройти процедуру аутентификации', 'error')
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
 
 def allowed_file(filename):
     """Проверяет, разрешён ли тип файла по расширению."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif'}
 
-def md5_for_file(file):
-    """Вычисляет md5-хеш для файла (для проверки уникальности обложки)."""
-    hash_md5 = hashlib.md5()
-    for chunk in iter(lambda: file.read(4096), b""):
-        hash_md5.update(chunk)
-    file.seek(0)
-    return hash_md5.hexdigest()
+def clean_html(text):
+    """Экранирует недопустимые HTML-теги с помощью bleach."""
+    import bleach
+    return bleach.clean(text)
 
 def sanitize_html(text):
     """Очищает и преобразует текст в безопасный HTML с помощью markdown и bleach."""
+    import bleach, markdown
     return bleach.clean(
         markdown.markdown(text),
         tags=list(bleach.sanitizer.ALLOWED_TAGS) + ['p', 'pre', 'span'],
@@ -49,126 +98,284 @@ def sanitize_html(text):
     )
 
 
+def build_suggest_index(suggest_index):
+    """Строит индекс автодополнения по всем книгам, запоминая текущий конец журнала outbox."""
+    position = outbox.head()
+    suggest_index.build(db.session.execute(db.select(Book.id, Book.title, Book.author)).all(), position)
+
+def sync_suggest_index(suggest_index):
+    """Применяет изменения книг, сделанные другими воркерами (события 'book' в outbox)."""
+    if not suggest_index.sync_lock.acquire(blocking=False):
+        return
+    try:
+        changes = outbox.changes_since('book', suggest_index.position)
+        if changes is None:
+            build_suggest_index(suggest_index)
+            return
+        position, book_ids = changes
+        books = db.session.execute(
+            db.select(Book.id, Book.title, Book.author).where(Book.id.in_(book_ids))
+        ).all() if book_ids else []
+        suggest_index.apply(position, book_ids, books)
+    finally:
+        suggest_index.sync_lock.release()
+
+def get_suggest_index():
+    """Возвращает индекс автодополнения, не чаще раза в SUGGEST_SYNC_INTERVAL секунд
+    догоняя изменения из других воркеров."""
+    suggest_index = current_app.extensions['suggest_index']
+    if not suggest_index.ready:
+        build_suggest_index(suggest_index)
+    elif suggest_index.sync_due(current_app.config['SUGGEST_SYNC_INTERVAL']):
+        sync_suggest_index(suggest_index)
+    return suggest_index
+
+
+def password_hasher():
+    """Возвращает пул хеширования паролей текущего приложения."""
+    return current_app.extensions['password_hasher']
+
+def rate_limited(*keys):
+    """Регистрирует попытку по ключам (тип, значение); True, если хотя бы один лимит превышен."""
+    limiter = current_app.extensions['login_limiter']
+    limits = {'user': current_app.config['LOGIN_RATE_LIMIT_USER'], 'ip': current_app.config['LOGIN_RATE_LIMIT_IP']}
+    return not all([limiter.hit(f'{kind}:{value}', limits[kind]) for kind, value in keys])
+
+
 @login_manager.user_loader
 def load_user(user_id):
     """Загружает пользователя по его ID для flask-login."""
     return db.session.get(User, int(user_id))
 
 
-@app.route('/')
+def bump_book_versions(book_ids):
+    """Увеличивает Book.version, чтобы кешированные карточки этих книг перерендерились."""
+    db.session.execute(db.update(Book).where(Book.id.in_(book_ids)).values(version=Book.version + 1))
+
+def catalog_filters(args):
+    """Извлекает параметры поиска по каталогу из query-string."""
+    return {
+        'title': args.get('title', '').strip(),
+        'author': args.get('author', '').strip(),
+        'genre_ids': args.getlist('genre', type=int),
+        'year_list': args.getlist('year', type=int),
+        'pages_from': args.get('pages_from', type=int),
+        'pages_to': args.get('pages_to', type=int)
+    }
+
+def catalog_select(filters):
+    """Строит запрос книг каталога с учётом фильтров (общий для синхронного и async-режима)."""
+    stmt = db.select(Book)
+    if filters['title']:
+        stmt = stmt.where(Book.title.ilike(f"%{filters['title']}%"))
+    if filters['author']:
+        stmt = stmt.where(Book.author.ilike(f"%{filters['author']}%"))
+    if filters['genre_ids']:
+        stmt = stmt.where(Book.genres.any(Genre.id.in_(filters['genre_ids'])))
+    if filters['year_list']:
+        stmt = stmt.where(Book.year.in_(filters['year_list']))
+    if filters['pages_from'] is not None:
+        stmt = stmt.where(Book.pages >= filters['pages_from'])
+    if filters['pages_to'] is not None:
+        stmt = stmt.where(Book.pages <= filters['pages_to'])
+    return stmt.order_by(Book.id.desc())
+
+def book_stats_select(book_ids):
+    """Средняя оценка и число одобренных рецензий для набора книг одним GROUP BY."""
+    return (
+        db.select(Review.book_id, func.avg(Review.rating), func.count(Review.id))
+        .join(ReviewStatus)
+        .where(ReviewStatus.name == 'approved', Review.book_id.in_(book_ids))
+        .group_by(Review.book_id)
+    )
+
+def apply_book_stats(books, rows):
+    """Проставляет книгам avg_rating и reviews_count по результату book_stats_select."""
+    stats = {book_id: (avg, count) for book_id, avg, count in rows}
+    for book in books:
+        book.avg_rating, book.reviews_count = stats.get(book.id, (None, 0))
+
+def catalog_template_filters(filters):
+    """Значения фильтров для сохранения состояния формы поиска."""
+    return dict(
+        filters,
+        pages_from=filters['pages_from'] if filters['pages_from'] is not None else '',
+        pages_to=filters['pages_to'] if filters['pages_to'] is not None else ''
+    )
+
+REVIEWS_PER_PAGE = 20
+REVIEW_SORTS = ('new', 'rating')
+
+def parse_review_cursor(value, sort):
+    """Разбирает курсор страницы рецензий: "<id>" для sort=new, "<оценка>-<id>" для sort=rating."""
+    try:
+        if sort == 'rating':
+            rating, review_id = value.split('-', 1)
+            return int(rating), int(review_id)
+        return int(value)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+def review_cursor(review, sort):
+    """Курсор, указывающий на позицию сразу после рецензии review."""
+    return f'{review.rating}-{review.id}' if sort == 'rating' else str(review.id)
+
+def approved_reviews_select(book_id, sort='new', after=None):
+    """Запрос одобренных рецензий книги с авторами и keyset-пагинацией.
+
+    sort='new' — от новых к старым (по ID, он растёт вместе с created_at),
+    sort='rating' — по убыванию оценки; after — результат parse_review_cursor.
+    """
+    stmt = (
+        db.select(Review)
+        .join(ReviewStatus)
+        .where(Review.book_id == book_id, ReviewStatus.name == 'approved')
+        .options(selectinload(Review.user))
+    )
+    if sort == 'rating':
+        if after is not None:
+            stmt = stmt.where(or_(Review.rating < after[0], and_(Review.rating == after[0], Review.id < after[1])))
+        return stmt.order_by(Review.rating.desc(), Review.id.desc())
+    if after is not None:
+        stmt = stmt.where(Review.id < after)
+    return stmt.order_by(Review.id.desc())
+
+def split_reviews_page(rows, sort):
+    """Отделяет страницу рецензий от лишней строки (запрос делается с limit + 1); возвращает (рецензии, курсор)."""
+    if len(rows) > REVIEWS_PER_PAGE:
+        return rows[:REVIEWS_PER_PAGE], review_cursor(rows[REVIEWS_PER_PAGE - 1], sort)
+    return rows, None
+
+def rating_histogram_select(book_id):
+    """Число одобренных рецензий книги по каждой оценке одним GROUP BY."""
+    return (
+        db.select(Review.rating, func.count(Review.id))
+        .join(ReviewStatus)
+        .where(Review.book_id == book_id, ReviewStatus.name == 'approved')
+        .group_by(Review.rating)
+    )
+
+def rating_histogram(rows):
+    """Гистограмма оценок 5..0 в виде списка (оценка, число, доля от максимума в %)."""
+    counts = {rating: count for rating, count in rows}
+    top = max(counts.values(), default=0)
+    return [(rating, counts.get(rating, 0), round(100 * counts.get(rating, 0) / top) if top else 0) for rating in range(5, -1, -1)]
+
+
+@bp.route('/')
 def index():
     """Главная страница: поиск и список книг."""
     page = request.args.get('page', 1, type=int)
-    # Новые поля поиска
-    title = request.args.get('title', '').strip()
-    author = request.args.get('author', '').strip()
-    genre_ids = request.args.getlist('genre', type=int)
-    year_list = request.args.getlist('year', type=int)
-    pages_from = request.args.get('pages_from', type=int)
-    pages_to = request.args.get('pages_to', type=int)
-
-    # Формируем базовый запрос
-    query = Book.query
-
-    if title:
-        query = query.filter(Book.title.ilike(f'%{title}%'))
-    if author:
-        query = query.filter(Book.author.ilike(f'%{author}%'))
-    if genre_ids:
-        query = query.join(Book.genres).filter(Genre.id.in_(genre_ids))
-    if year_list:
-        query = query.filter(Book.year.in_(year_list))
-    if pages_from is not None:
-        query = query.filter(Book.pages >= pages_from)
-    if pages_to is not None:
-        query = query.filter(Book.pages <= pages_to)
+    filters = catalog_filters(request.args)
 
     # Для мультиселектов
     all_genres = Genre.query.order_by(Genre.name).all()
     all_years = [y[0] for y in db.session.query(Book.year).distinct().order_by(Book.year.desc()).all()]
 
-    books = query.order_by(Book.id.desc()).paginate(page=page, per_page=10)
-    for book in books.items:
-        book.avg_rating = db.session.query(func.avg(Review.rating)).filter(Review.book_id==book.id, Review.status.has(name='approved')).scalar()
-        book.reviews_count = Review.query.filter_by(book_id=book.id, status_id=ReviewStatus.query.filter_by(name='approved').first().id).count()
-    # Передаём значения фильтров для сохранения состояния формы
+    books = db.paginate(catalog_select(filters), page=page, per_page=10)
+    apply_book_stats(books.items, db.session.execute(book_stats_select([b.id for b in books.items])))
     return render_template(
         'index.html',
         books=books,
         all_genres=all_genres,
         all_years=all_years,
-        filters={
-            'title': title,
-            'author': author,
-            'genre_ids': genre_ids,
-            'year_list': year_list,
-            'pages_from': pages_from if pages_from is not None else '',
-            'pages_to': pages_to if pages_to is not None else ''
-        }
+        filters=catalog_template_filters(filters)
     )
 
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/api/suggest')
+def api_suggest():
+    """Автодополнение по префиксу названия или автора книги (без запросов к БД)."""
+    q = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    return jsonify(get_suggest_index().search(q, limit=limit))
+
+
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     """Страница входа пользователя."""
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     form = LoginForm()
     if form.validate_on_submit():
+        username_key = ('user', form.username.data.casefold())
+        if rate_limited(username_key, ('ip', request.remote_addr)):
+            flash('Слишком много попыток входа. Попробуйте позже.', 'error')
+            return render_template('login.html', form=form), 429
         user = User.query.filter_by(username=form.username.data).first()
-        if user and check_password_hash(user.password_hash, form.password.data):
+        try:
+            ok, new_hash = password_hasher().verify_and_update(user.password_hash, form.password.data) if user else (False, None)
+        except PasswordHasherBusy:
+            flash('Сервер перегружен. Попробуйте войти позже.', 'error')
+            return render_template('login.html', form=form), 503
+        if ok:
+            if new_hash:
+                user.password_hash = new_hash
+                outbox.record('user', user.id, 'update')
+                db.session.commit()
+            current_app.extensions['login_limiter'].reset(':'.join(username_key))
             login_user(user, remember=form.remember_me.data)
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
         flash('Невозможно аутентифицироваться с указанными логином и паролем', 'error')
     return render_template('login.html', form=form)
 
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     """Выход пользователя из системы."""
     logout_user()
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     """Страница регистрации нового пользователя."""
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     form = RegisterForm()
     if form.validate_on_submit():
+        if rate_limited(('ip', request.remote_addr)):
+            flash('Слишком много попыток. Попробуйте позже.', 'error')
+            return render_template('register.html', form=form), 429
         if User.query.filter_by(username=form.username.data).first():
             flash('Пользователь с таким логином уже существует', 'error')
         else:
+            try:
+                password_hash = password_hasher().hash(form.password.data)
+            except PasswordHasherBusy:
+                flash('Сервер перегружен. Попробуйте позже.', 'error')
+                return render_template('register.html', form=form), 503
             user_role = Role.query.filter_by(name='user').first()
             user = User(
                 username=form.username.data,
-                password_hash=generate_password_hash(form.password.data),
+                password_hash=password_hash,
                 last_name=form.last_name.data,
                 first_name=form.first_name.data,
                 middle_name=form.middle_name.data,
                 role_id=user_role.id
             )
             db.session.add(user)
+            db.session.flush()
+            outbox.record('user', user.id, 'insert')
             db.session.commit()
             flash('Регистрация успешна. Теперь вы можете войти.', 'success')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
     return render_template('register.html', form=form)
 
 
-@app.route('/book/add', methods=['GET', 'POST'])
+@bp.route('/book/add', methods=['GET', 'POST'])
 @login_required
 def add_book():
     """Добавление новой книги (только для администратора)."""
     if current_user.role.name != 'admin':
         flash('У вас недостаточно прав для выполнения данного действия', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     form = BookForm()
     form.genres.choices = [(g.id, g.name) for g in Genre.query.all()]
     if form.validate_on_submit():
         try:
-            safe_description = bleach.clean(form.description.data)
+            safe_description = clean_html(form.description.data)
             book = Book(
                 title=form.title.data,
                 description=safe_description,
@@ -187,26 +394,12 @@ def add_book():
             file = form.cover.data
             if file and hasattr(file, "filename") and file.filename:
                 if allowed_file(file.filename):
-                    md5 = md5_for_file(file)
-                    cover = Cover.query.filter_by(md5_hash=md5).first()
-                    if cover:
-                        book.cover_id = cover.id
-                    else:
-                        cover = Cover(
-                            filename='',
-                            mime_type=file.mimetype,
-                            md5_hash=md5
-                        )
-                        db.session.add(cover)
-                        db.session.flush()
-                        filename = f"{cover.id}.jpg"
-                        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                        cover.filename = filename
-                        db.session.commit()
-                        book.cover_id = cover.id
+                    book.cover = store_cover(file)
+            outbox.record_books([book.id], 'insert')
             db.session.commit()
+            get_suggest_index().add(book)
             flash('Книга успешно добавлена', 'success')
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
         except Exception as e:
             db.session.rollback()
             import traceback
@@ -215,7 +408,7 @@ def add_book():
             flash(f'При сохранении данных возникла ошибка: {e}. Проверьте корректность введённых данных.', 'error')
     return render_template('book_form.html', form=form, book=None)
 
-@app.route('/book/<int:book_id>/edit', methods=['GET', 'POST'])
+@bp.route('/book/<int:book_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_book(book_id):
     """Редактирование информации о книге (админ/модератор)."""
@@ -224,7 +417,7 @@ def edit_book(book_id):
         abort(404)
     if current_user.role.name not in ['admin', 'moderator']:
         flash('У вас недостаточно прав для выполнения данного действия', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     form = BookForm(obj=book)
     form.genres.choices = [(g.id, g.name) for g in Genre.query.all()]
     if request.method == 'GET':
@@ -232,39 +425,25 @@ def edit_book(book_id):
     if form.validate_on_submit():
         try:
             book.title = form.title.data
-            book.description = bleach.clean(form.description.data)
+            book.description = clean_html(form.description.data)
             book.year = form.year.data
             book.publisher = form.publisher.data
             book.author = form.author.data
             book.pages = form.pages.data
             book.genres = [db.session.get(Genre, gid) for gid in form.genres.data]
+            bump_book_versions([book.id])
             file = form.cover.data
             if file and hasattr(file, "read") and hasattr(file, "filename") and file.filename:
                 if allowed_file(file.filename):
-                    md5 = md5_for_file(file)
-                    cover = Cover.query.filter_by(md5_hash=md5).first()
-                    if cover:
-                        book.cover_id = cover.id
-                    else:
-                        if book.cover:
-                            old_cover = book.cover
-                            if Book.query.filter(Book.cover_id == old_cover.id, Book.id != book.id).count() == 0:
-                                old_path = os.path.join(app.config['UPLOAD_FOLDER'], old_cover.filename)
-                                if os.path.exists(old_path):
-                                    os.remove(old_path)
-                                db.session.delete(old_cover)
-                                db.session.flush()
-                        cover = Cover(filename='', mime_type=file.mimetype, md5_hash=md5)
-                        db.session.add(cover)
-                        db.session.flush()
-                        filename = f"{cover.id}.jpg"
-                        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                        cover.filename = filename
-                        db.session.commit()
-                        book.cover_id = cover.id
+                    old_cover = book.cover
+                    book.cover = store_cover(file)
+                    if old_cover is not None and old_cover.id != book.cover.id:
+                        release_cover(old_cover, book.id)
+            outbox.record_books([book.id])
             db.session.commit()
+            get_suggest_index().add(book)
             flash('Книга успешно обновлена', 'success')
-            return redirect(url_for('book_view', book_id=book.id))
+            return redirect(url_for('main.book_view', book_id=book.id))
         except Exception as e:
             db.session.rollback()
             import traceback
@@ -273,50 +452,61 @@ def edit_book(book_id):
             flash(f'Ошибка при обновлении книги: {e}', 'error')
     return render_template('book_form.html', form=form, book=book)
 
-@app.route('/book/<int:book_id>')
+@bp.route('/book/<int:book_id>')
 def book_view(book_id):
     """Просмотр информации о книге и её рецензий."""
     book = Book.query.get_or_404(book_id)
     book.description_html = sanitize_html(book.description)
-    reviews = Review.query.filter_by(book_id=book.id).join(ReviewStatus).filter(ReviewStatus.name=='approved').order_by(Review.created_at.desc()).all()
+    sort = request.args.get('sort', 'new')
+    if sort not in REVIEW_SORTS:
+        sort = 'new'
+    after = parse_review_cursor(request.args.get('after'), sort)
+    reviews, next_cursor = split_reviews_page(
+        db.session.scalars(approved_reviews_select(book.id, sort, after).limit(REVIEWS_PER_PAGE + 1)).all(), sort
+    )
     for r in reviews:
         r.text_html = sanitize_html(r.text)
+    histogram = rating_histogram(db.session.execute(rating_histogram_select(book.id)))
     can_review = False
     if current_user.is_authenticated and current_user.role.name in ['user', 'moderator', 'admin']:
         exists = Review.query.filter_by(book_id=book.id, user_id=current_user.id).first()
         if not exists:
             can_review = True
-    return render_template('book_view.html', book=book, reviews=reviews, can_review=can_review)
+    return render_template(
+        'book_view.html', book=book, reviews=reviews, can_review=can_review,
+        sort=sort, next_cursor=next_cursor, histogram=histogram
+    )
 
-@app.route('/book/<int:book_id>/delete')
+@bp.route('/book/<int:book_id>/delete')
 @login_required
 def delete_book(book_id):
     """Удаление книги (только для администратора)."""
     if current_user.role.name != 'admin':
         flash('У вас недостаточно прав для выполнения данного действия', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     book = Book.query.get_or_404(book_id)
     try:
-        if book.cover:
-            cover_path = os.path.join(app.config['UPLOAD_FOLDER'], book.cover.filename)
-            if os.path.exists(cover_path):
-                os.remove(cover_path)
+        cover = book.cover
+        outbox.record('book', book.id, 'delete', book.version)
         db.session.delete(book)
+        db.session.flush()
+        release_cover(cover, book_id)
         db.session.commit()
+        get_suggest_index().remove(book_id)
         flash('Книга удалена', 'success')
     except Exception as e:
         db.session.rollback()
         flash('Ошибка при удалении книги', 'error')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/book/<int:book_id>/review', methods=['GET', 'POST'])
+@bp.route('/book/<int:book_id>/review', methods=['GET', 'POST'])
 @login_required
 def add_review(book_id):
     """Добавление рецензии на книгу (одна рецензия на книгу от пользователя)."""
     book = Book.query.get_or_404(book_id)
     if Review.query.filter_by(book_id=book.id, user_id=current_user.id).first():
         flash('Вы уже оставляли рецензию на эту книгу', 'error')
-        return redirect(url_for('book_view', book_id=book.id))
+        return redirect(url_for('main.book_view', book_id=book.id))
     form = ReviewForm()
     if form.validate_on_submit():
         try:
@@ -329,15 +519,17 @@ def add_review(book_id):
                 status_id=status.id
             )
             db.session.add(review)
+            db.session.flush()
+            outbox.record('review', review.id, 'insert')
             db.session.commit()
             flash('Рецензия отправлена на модерацию', 'success')
-            return redirect(url_for('book_view', book_id=book.id))
+            return redirect(url_for('main.book_view', book_id=book.id))
         except Exception as e:
             db.session.rollback()
             flash('Ошибка при добавлении рецензии', 'error')
     return render_template('review_form.html', form=form)
 
-@app.route('/my-reviews')
+@bp.route('/my-reviews')
 @login_required
 def my_reviews():
     """Список рецензий текущего пользователя."""
@@ -346,13 +538,13 @@ def my_reviews():
         r.text_html = sanitize_html(r.text)
     return render_template('my_reviews.html', reviews=reviews)
 
-@app.route('/moderate')
+@bp.route('/moderate')
 @login_required
 def moderate():
     """Список рецензий на модерацию (для модератора)."""
     if current_user.role.name != 'moderator':
         flash('У вас недостаточно прав для выполнения данного действия', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     page = request.args.get('page', 1, type=int)
     status = ReviewStatus.query.filter_by(name='pending').first()
     reviews = Review.query.filter_by(status_id=status.id).order_by(Review.created_at).paginate(page=page, per_page=10)
@@ -360,13 +552,13 @@ def moderate():
         r.text_html = sanitize_html(r.text)
     return render_template('moderate.html', reviews=reviews)
 
-@app.route('/moderate/<int:review_id>', methods=['GET', 'POST'])
+@bp.route('/moderate/<int:review_id>', methods=['GET', 'POST'])
 @login_required
 def moderate_review(review_id):
     """Рассмотрение одной рецензии (одобрить/отклонить, только модератор)."""
     if current_user.role.name != 'moderator':
         flash('У вас недостаточно прав для выполнения данного действия', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     review = Review.query.get_or_404(review_id)
     review.text_html = sanitize_html(review.text)
     if request.method == 'POST':
@@ -376,34 +568,18 @@ def moderate_review(review_id):
                 review.status_id = ReviewStatus.query.filter_by(name='approved').first().id
             elif action == 'reject':
                 review.status_id = ReviewStatus.query.filter_by(name='rejected').first().id
+            bump_book_versions([review.book_id])
+            outbox.record('review', review.id, 'update')
+            outbox.record_books([review.book_id])
             db.session.commit()
             flash('Статус рецензии обновлён', 'success')
-            return redirect(url_for('moderate'))
+            return redirect(url_for('main.moderate'))
         except Exception as e:
             db.session.rollback()
             flash('Ошибка при обновлении статуса', 'error')
     return render_template('moderate_review.html', review=review)
 
-class UserEditForm(FlaskForm):
-    """Форма редактирования пользователя (для администратора)."""
-    last_name = StringField('Фамилия', validators=[DataRequired(), Length(max=64)])
-    first_name = StringField('Имя', validators=[DataRequired(), Length(max=64)])
-    middle_name = StringField('Отчество', validators=[Length(max=64)])
-    role_id = SelectField('Роль', coerce=int)
-    password = PasswordField('Новый пароль')
-    submit = SubmitField('Сохранить')
-
-class UserAddForm(FlaskForm):
-    """Форма добавления пользователя (для администратора)."""
-    username = StringField('Логин', validators=[DataRequired(), Length(max=64)])
-    password = PasswordField('Пароль', validators=[DataRequired(), Length(min=4)])
-    last_name = StringField('Фамилия', validators=[DataRequired(), Length(max=64)])
-    first_name = StringField('Имя', validators=[DataRequired(), Length(max=64)])
-    middle_name = StringField('Отчество', validators=[Length(max=64)])
-    role_id = SelectField('Роль', coerce=int)
-    submit = SubmitField('Добавить')
-
-@app.route('/users')
+@bp.route('/users')
 @login_required
 def users():
     """Список пользователей (только для администратора)."""
@@ -412,7 +588,7 @@ def users():
     users = User.query.order_by(User.id).all()
     return render_template('users.html', users=users)
 
-@app.route('/users/add', methods=['GET', 'POST'])
+@bp.route('/users/add', methods=['GET', 'POST'])
 @login_required
 def add_user():
     """Добавление нового пользователя (только для администратора)."""
@@ -424,21 +600,28 @@ def add_user():
         if User.query.filter_by(username=form.username.data).first():
             flash('Пользователь с таким логином уже существует', 'error')
         else:
+            try:
+                password_hash = password_hasher().hash(form.password.data)
+            except PasswordHasherBusy:
+                flash('Сервер перегружен. Попробуйте позже.', 'error')
+                return render_template('user_add.html', form=form), 503
             user = User(
                 username=form.username.data,
-                password_hash=generate_password_hash(form.password.data),
+                password_hash=password_hash,
                 last_name=form.last_name.data,
                 first_name=form.first_name.data,
                 middle_name=form.middle_name.data,
                 role_id=form.role_id.data
             )
             db.session.add(user)
+            db.session.flush()
+            outbox.record('user', user.id, 'insert')
             db.session.commit()
             flash('Пользователь добавлен', 'success')
-            return redirect(url_for('users'))
+            return redirect(url_for('main.users'))
     return render_template('user_add.html', form=form)
 
-@app.route('/users/<int:user_id>/edit', methods=['GET', 'POST'])
+@bp.route('/users/<int:user_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_user(user_id):
     """Редактирование пользователя (только для администратора)."""
@@ -448,18 +631,23 @@ def edit_user(user_id):
     form = UserEditForm(obj=user)
     form.role_id.choices = [(role.id, role.name) for role in Role.query.all()]
     if form.validate_on_submit():
+        if form.password.data:
+            try:
+                user.password_hash = password_hasher().hash(form.password.data)
+            except PasswordHasherBusy:
+                flash('Сервер перегружен. Попробуйте позже.', 'error')
+                return render_template('user_edit.html', form=form, user=user), 503
         user.last_name = form.last_name.data
         user.first_name = form.first_name.data
         user.middle_name = form.middle_name.data
         user.role_id = form.role_id.data
-        if form.password.data:
-            user.password_hash = generate_password_hash(form.password.data)
+        outbox.record('user', user.id, 'update')
         db.session.commit()
         flash('Пользователь обновлён', 'success')
-        return redirect(url_for('users'))
+        return redirect(url_for('main.users'))
     return render_template('user_edit.html', form=form, user=user)
 
-@app.route('/users/<int:user_id>/delete', methods=['POST'])
+@bp.route('/users/<int:user_id>/delete', methods=['POST'])
 @login_required
 def delete_user(user_id):
     """Удаление пользователя (только для администратора, нельзя удалить себя)."""
@@ -468,26 +656,30 @@ def delete_user(user_id):
     user = User.query.get_or_404(user_id)
     if user.id == current_user.id:
         flash('Нельзя удалить самого себя.', 'error')
-        return redirect(url_for('users'))
+        return redirect(url_for('main.users'))
+    reviewed_books = [row[0] for row in db.session.execute(db.select(Review.book_id).where(Review.user_id == user.id))]
+    bump_book_versions(reviewed_books)
+    outbox.record_books(reviewed_books)
+    outbox.record('user', user.id, 'delete')
     db.session.delete(user)
     db.session.commit()
     flash('Пользователь удалён', 'success')
-    return redirect(url_for('users'))
+    return redirect(url_for('main.users'))
 
-@app.errorhandler(401)
+@bp.app_errorhandler(401)
 def unauthorized(e):
     """Обработка ошибки 401 (неавторизован)."""
     flash('Для выполнения данного действия необходимо пройти процедуру аутентификации', 'error')
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
-@app.errorhandler(403)
+@bp.app_errorhandler(403)
 def forbidden(e):
     """Обработка ошибки 403 (нет прав доступа)."""
     flash('У вас недостаточно прав для выполнения данного действия', 'error')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
 
-@app.route('/all-reviews')
+@bp.route('/all-reviews')
 @login_required
 def all_reviews():
     """Список всех рецензий (только для администратора)."""
@@ -498,7 +690,7 @@ def all_reviews():
         r.text_html = sanitize_html(r.text)
     return render_template('all_reviews.html', reviews=reviews)
 
-@app.route('/collections')
+@bp.route('/collections')
 @login_required
 def my_collections():
     """Список подборок пользователя (только для обычного пользователя)."""
@@ -515,7 +707,7 @@ def my_collections():
     ]
     return render_template('my_collections.html', collections=collections_info)
 
-@app.route('/collections/<int:collection_id>')
+@bp.route('/collections/<int:collection_id>')
 @login_required
 def collection_view(collection_id):
     """Просмотр одной подборки пользователя."""
@@ -524,7 +716,7 @@ def collection_view(collection_id):
         abort(403)
     return render_template('collection_view.html', collection=collection)
 
-@app.route('/collections/add', methods=['POST'])
+@bp.route('/collections/add', methods=['POST'])
 @login_required
 def add_collection():
     """Добавление новой подборки (только для пользователя)."""
@@ -533,14 +725,16 @@ def add_collection():
     name = request.form.get('name', '').strip()
     if not name:
         flash('Название подборки не может быть пустым', 'error')
-        return redirect(url_for('my_collections'))
+        return redirect(url_for('main.my_collections'))
     collection = Collection(name=name, user_id=current_user.id)
     db.session.add(collection)
+    db.session.flush()
+    outbox.record('collection', collection.id, 'insert')
     db.session.commit()
     flash('Подборка успешно добавлена', 'success')
-    return redirect(url_for('my_collections'))
+    return redirect(url_for('main.my_collections'))
 
-@app.route('/collections/<int:collection_id>/add_book', methods=['POST'])
+@bp.route('/collections/<int:collection_id>/add_book', methods=['POST'])
 @login_required
 def add_book_to_collection(collection_id):
     """Добавление книги в подборку (только для пользователя)."""
@@ -553,25 +747,27 @@ def add_book_to_collection(collection_id):
     book = Book.query.get_or_404(book_id)
     if book not in collection.books:
         collection.books.append(book)
+        outbox.record('collection', collection.id, 'update')
         db.session.commit()
         flash('Книга добавлена в подборку', 'success')
     else:
         flash('Книга уже есть в подборке', 'error')
-    return redirect(url_for('book_view', book_id=book_id))
+    return redirect(url_for('main.book_view', book_id=book_id))
 
-@app.route('/collections/<int:collection_id>/delete', methods=['POST'])
+@bp.route('/collections/<int:collection_id>/delete', methods=['POST'])
 @login_required
 def delete_collection(collection_id):
     """Удаление подборки пользователя."""
     collection = Collection.query.get_or_404(collection_id)
     if collection.user_id != current_user.id:
         abort(403)
+    outbox.record('collection', collection.id, 'delete')
     db.session.delete(collection)
     db.session.commit()
     flash('Подборка удалена', 'success')
-    return redirect(url_for('my_collections'))
+    return redirect(url_for('main.my_collections'))
 
-@app.route('/collections/<int:collection_id>/remove_book', methods=['POST'])
+@bp.route('/collections/<int:collection_id>/remove_book', methods=['POST'])
 @login_required
 def remove_book_from_collection(collection_id):
     """Удаление книги из подборки пользователя."""
@@ -582,56 +778,12 @@ def remove_book_from_collection(collection_id):
     book = Book.query.get_or_404(book_id)
     if book in collection.books:
         collection.books.remove(book)
+        outbox.record('collection', collection.id, 'update')
         db.session.commit()
         flash('Книга удалена из подборки', 'success')
     else:
         flash('Книга не найдена в подборке', 'error')
-    return redirect(url_for('collection_view', collection_id=collection_id))
+    return redirect(url_for('main.collection_view', collection_id=collection_id))
 
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-        from werkzeug.security import generate_password_hash
-        from models import User, Role, ReviewStatus, Genre
-        roles_data = [
-            ('admin', 'Администратор: полный доступ'),
-            ('moderator', 'Модератор: редактирование книг, модерация рецензий'),
-            ('user', 'Пользователь: может оставлять рецензии')
-        ]
-        for name, desc in roles_data:
-            if not Role.query.filter_by(name=name).first():
-                db.session.add(Role(name=name, description=desc))
-        db.session.commit()
-        users_data = [
-            ('admin', 'admin', 'Админ', 'Админ', '', 'admin'),
-            ('moder', 'moder', 'Модер', 'Модератор', '', 'moderator'),
-            ('user', 'user', 'Пользователь', 'Обычный', '', 'user')
-        ]
-        for username, password, last_name, first_name, middle_name, role_name in users_data:
-            role = Role.query.filter_by(name=role_name).first()
-            if role and not User.query.filter_by(username=username).first():
-                user = User(
-                    username=username,
-                    password_hash=generate_password_hash(password),
-                    last_name=last_name,
-                    first_name=first_name,
-                    middle_name=middle_name,
-                    role_id=role.id
-                )
-                db.session.add(user)
-        db.session.commit()
-        for status_name in ['pending', 'approved', 'rejected']:
-            if not ReviewStatus.query.filter_by(name=status_name).first():
-                db.session.add(ReviewStatus(name=status_name))
-        db.session.commit()
-        default_genres = [
-            'Фантастика', 'Детектив', 'Роман', 'Поэзия', 'Научная литература',
-            'Приключения', 'Фэнтези', 'История', 'Биография', 'Драма',
-            'Триллер', 'Ужасы', 'Комедия', 'Психология', 'Детская литература',
-            'Энциклопедия', 'Публицистика', 'Мемуары', 'Любовный роман', 'Саморазвитие'
-        ]
-        for genre_name in default_genres:
-            if not Genre.query.filter_by(name=genre_name).first():
-                db.session.add(Genre(name=genre_name))
-        db.session.commit()
-    app.run(debug=True)
+    create_app().run(debug=True)
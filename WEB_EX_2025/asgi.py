@@ -0,0 +1,259 @@
+"""
+Асинхронный режим обслуживания read-only маршрутов (каталог, карточка книги, JSON API).
+
+Запуск: `uvicorn asgi:app --workers 4`.
+Главная страница, /book/<id> и /api/suggest обслуживаются на async SQLAlchemy-сессиях
+(aiosqlite локально, asyncpg/aiomysql для серверных БД), поэтому медленные клиенты
+не удерживают воркер на время запроса к базе. Все остальные маршруты передаются
+в обычное Flask-приложение, модели и шаблоны общие с app.py.
+"""
+
+import contextlib
+import mimetypes
+import stat
+from a2wsgi import WSGIMiddleware
+from flask import g, render_template, session
+from flask_login import AnonymousUserMixin
+from flask_login.utils import decode_cookie
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import configure_mappers, selectinload
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, HTMLResponse, JSONResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+from werkzeug.datastructures import MultiDict
+from app import (create_app, catalog_filters, catalog_select, book_stats_select, apply_book_stats,
+                 catalog_template_filters, approved_reviews_select, sanitize_html, REVIEW_SORTS,
+                 REVIEWS_PER_PAGE, parse_review_cursor, split_reviews_page, rating_histogram_select,
+                 rating_histogram, get_suggest_index)
+from compression import PRECOMPRESSED, carries_csrf_token, compress, is_compressible, is_fresh, negotiate
+from models import db, User, Book, Genre, Review
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql',
+    'mariadb': 'mariadb+aiomysql'
+}
+
+PER_PAGE = 10
+
+
+def async_database_url(url):
+    """Заменяет синхронный драйвер в URL базы данных на асинхронный."""
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+class Page:
+    """Страница выборки с тем же интерфейсом, что и Pagination из Flask-SQLAlchemy."""
+
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self.pages = -(-total // per_page)
+        self.has_prev = page > 1
+        self.has_next = page < self.pages
+        self.prev_num = page - 1 if self.has_prev else None
+        self.next_num = page + 1 if self.has_next else None
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles, отдающий готовые .br/.gz-копии файлов (см. flask compress-static)."""
+
+    async def get_response(self, path, scope):
+        mimetype = mimetypes.guess_type(path)[0]
+        if is_compressible(mimetype):
+            encoding = negotiate(Headers(scope=scope).get('accept-encoding'))
+            if encoding is not None:
+                full_path, stat_result = await run_in_threadpool(self.lookup_path, path + PRECOMPRESSED[encoding])
+                _, source_stat = await run_in_threadpool(self.lookup_path, path)
+                if (stat_result is not None and stat.S_ISREG(stat_result.st_mode) and source_stat is not None
+                        and is_fresh(stat_result.st_mtime, source_stat.st_mtime)):
+                    return FileResponse(
+                        full_path, stat_result=stat_result, media_type=mimetype,
+                        headers={'Content-Encoding': encoding, 'Vary': 'Accept-Encoding'}
+                    )
+        return await super().get_response(path, scope)
+
+
+def create_asgi_app(flask_app=None):
+    """Создаёт ASGI-приложение поверх Flask-приложения из create_app()."""
+    flask_app = flask_app or create_app()
+    configure_mappers()
+    with flask_app.app_context():
+        url = flask_app.config.get('ASYNC_DATABASE_URI') or async_database_url(db.engine.url)
+    engine = create_async_engine(url)
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+    suggest_index = flask_app.extensions['suggest_index']
+    session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    compress_min_size = flask_app.config['COMPRESS_MIN_SIZE']
+    compress_level = flask_app.config['COMPRESS_LEVEL']
+    suggest_sync_interval = flask_app.config['SUGGEST_SYNC_INTERVAL']
+
+    def compressed(request, response, csrf=False):
+        """Сжимает готовый ответ по Accept-Encoding так же, как compress_response во Flask-части."""
+        if csrf:
+            return response
+        response.headers.append('Vary', 'Accept-Encoding')
+        encoding = negotiate(request.headers.get('accept-encoding'))
+        if encoding is not None and len(response.body) >= compress_min_size:
+            response.body = compress(response.body, encoding, compress_level)
+            response.headers['Content-Encoding'] = encoding
+            response.headers['Content-Length'] = str(len(response.body))
+        return response
+
+    async def load_current_user(request, session):
+        """Определяет пользователя по cookie сессии Flask (или remember-cookie flask-login)."""
+        user_id = None
+        cookie = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+        if cookie:
+            with contextlib.suppress(Exception):
+                user_id = session_serializer.loads(
+                    cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds())
+                ).get('_user_id')
+        remember = request.cookies.get(flask_app.config.get('REMEMBER_COOKIE_NAME', 'remember_token'))
+        if user_id is None and remember:
+            with flask_app.app_context():
+                user_id = decode_cookie(remember)
+        if user_id is None:
+            return AnonymousUserMixin()
+        user = await session.scalar(
+            select(User).where(User.id == int(user_id))
+            .options(selectinload(User.role), selectinload(User.collections))
+        )
+        return user or AnonymousUserMixin()
+
+    def synced_suggest_index():
+        """Индекс автодополнения с изменениями других воркеров (синхронный запрос к журналу outbox)."""
+        with flask_app.app_context():
+            return get_suggest_index()
+
+    def render(request, user, template, **context):
+        """Рендерит Jinja-шаблон Flask-приложения с подставленным current_user.
+
+        Контекст получает cookie исходного запроса, поэтому flash-сообщения из сессии
+        показываются и удаляются так же, как в WSGI-части. Возвращает HTML, заголовки
+        Set-Cookie изменённой сессии и признак того, что в HTML попал CSRF-токен.
+        """
+        with flask_app.test_request_context(
+            request.url.path, query_string=request.url.query,
+            headers={'Cookie': request.headers.get('cookie', '')}
+        ):
+            g._login_user = user
+            html = render_template(template, **context)
+            response = flask_app.response_class()
+            flask_app.session_interface.save_session(flask_app, session, response)
+            csrf = carries_csrf_token()
+        return html, response.headers.getlist('Set-Cookie'), csrf
+
+    def html_response(request, rendered):
+        """HTMLResponse из результата render() с cookie сессии и сжатием."""
+        html, cookies, csrf = rendered
+        response = HTMLResponse(html)
+        for cookie in cookies:
+            response.headers.append('Set-Cookie', cookie)
+        if cookies:
+            response.headers.append('Vary', 'Cookie')
+        return compressed(request, response, csrf)
+
+    async def index(request):
+        args = MultiDict(request.query_params.multi_items())
+        page = args.get('page', 1, type=int)
+        filters = catalog_filters(args)
+        if page < 1:
+            raise HTTPException(404)
+        async with Session() as session:
+            user = await load_current_user(request, session)
+            all_genres = (await session.scalars(select(Genre).order_by(Genre.name))).all()
+            all_years = (await session.scalars(select(Book.year).distinct().order_by(Book.year.desc()))).all()
+            stmt = catalog_select(filters)
+            total = await session.scalar(select(db.func.count()).select_from(stmt.order_by(None).subquery()))
+            items = (await session.scalars(
+                stmt.options(selectinload(Book.cover), selectinload(Book.genres))
+                .limit(PER_PAGE).offset((page - 1) * PER_PAGE)
+            )).all()
+            if page > 1 and not items:
+                raise HTTPException(404)
+            apply_book_stats(items, await session.execute(book_stats_select([b.id for b in items])))
+        rendered = await run_in_threadpool(
+            render, request, user, 'index.html',
+            books=Page(items, page, PER_PAGE, total),
+            all_genres=all_genres,
+            all_years=all_years,
+            filters=catalog_template_filters(filters)
+        )
+        return html_response(request, rendered)
+
+    async def book_view(request):
+        book_id = request.path_params['book_id']
+        sort = request.query_params.get('sort', 'new')
+        if sort not in REVIEW_SORTS:
+            sort = 'new'
+        after = parse_review_cursor(request.query_params.get('after'), sort)
+        async with Session() as session:
+            user = await load_current_user(request, session)
+            book = await session.scalar(
+                select(Book).where(Book.id == book_id)
+                .options(selectinload(Book.cover), selectinload(Book.genres))
+            )
+            if book is None:
+                raise HTTPException(404)
+            reviews, next_cursor = split_reviews_page((await session.scalars(
+                approved_reviews_select(book.id, sort, after).limit(REVIEWS_PER_PAGE + 1)
+            )).all(), sort)
+            histogram = rating_histogram(await session.execute(rating_histogram_select(book.id)))
+            can_review = False
+            if user.is_authenticated and user.role.name in ['user', 'moderator', 'admin']:
+                exists = await session.scalar(
+                    select(Review.id).where(Review.book_id == book.id, Review.user_id == user.id)
+                )
+                can_review = exists is None
+
+        def render_book():
+            book.description_html = sanitize_html(book.description)
+            for r in reviews:
+                r.text_html = sanitize_html(r.text)
+            return render(
+                request, user, 'book_view.html', book=book, reviews=reviews, can_review=can_review,
+                sort=sort, next_cursor=next_cursor, histogram=histogram
+            )
+
+        return html_response(request, await run_in_threadpool(render_book))
+
+    async def api_suggest(request):
+        q = request.query_params.get('q', '').strip()
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            limit = 10
+        index = suggest_index
+        if not index.ready or index.sync_due(suggest_sync_interval):
+            index = await run_in_threadpool(synced_suggest_index)
+        return compressed(request, JSONResponse(index.search(q, limit=limit)))
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        if not suggest_index.ready:
+            await run_in_threadpool(synced_suggest_index)
+        yield
+        await engine.dispose()
+
+    return Starlette(
+        routes=[
+            Route('/', index),
+            Route('/book/{book_id:int}', book_view),
+            Route('/api/suggest', api_suggest),
+            Mount('/static', PrecompressedStaticFiles(directory=flask_app.static_folder), name='static'),
+            Mount('/', WSGIMiddleware(flask_app))
+        ],
+        lifespan=lifespan
+    )
+
+
+app = create_asgi_app()
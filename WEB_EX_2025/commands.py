@@ -0,0 +1,131 @@
+"""
+CLI-команды приложения (flask <команда>).
+"""
+
+import click
+from flask import current_app
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+from models import db, User, Role, ReviewStatus, Genre
+from covers import collect_garbage, merge_near_duplicates
+import outbox
+from compression import compress_static_files
+
+ROLES = [
+    ('admin', 'Администратор: полный доступ'),
+    ('moderator', 'Модератор: редактирование книг, модерация рецензий'),
+    ('user', 'Пользователь: может оставлять рецензии')
+]
+
+USERS = [
+    ('admin', 'admin', 'Админ', 'Админ', '', 'admin'),
+    ('moder', 'moder', 'Модер', 'Модератор', '', 'moderator'),
+    ('user', 'user', 'Пользователь', 'Обычный', '', 'user')
+]
+
+REVIEW_STATUSES = ['pending', 'approved', 'rejected']
+
+GENRES = [
+    'Фантастика', 'Детектив', 'Роман', 'Поэзия', 'Научная литература',
+    'Приключения', 'Фэнтези', 'История', 'Биография', 'Драма',
+    'Триллер', 'Ужасы', 'Комедия', 'Психология', 'Детская литература',
+    'Энциклопедия', 'Публицистика', 'Мемуары', 'Любовный роман', 'Саморазвитие'
+]
+
+
+def insert_ignore(model, rows, key):
+    """Вставляет строки одним запросом, пропуская уже существующие по уникальному ключу key."""
+    if not rows:
+        return
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(table).on_conflict_do_nothing(index_elements=[key])
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table).on_conflict_do_nothing(index_elements=[key])
+    elif dialect in ('mysql', 'mariadb'):
+        stmt = insert(table).prefix_with('IGNORE')
+    else:
+        existing = set(db.session.scalars(db.select(table.c[key]).where(table.c[key].in_([r[key] for r in rows]))))
+        rows = [r for r in rows if r[key] not in existing]
+        if not rows:
+            return
+        stmt = insert(table)
+    db.session.execute(stmt, rows)
+
+
+def seed_reference_data():
+    """Идемпотентно заполняет справочники (роли, статусы, жанры) и учётные записи по умолчанию."""
+    insert_ignore(Role, [{'name': name, 'description': desc} for name, desc in ROLES], 'name')
+    insert_ignore(ReviewStatus, [{'name': name} for name in REVIEW_STATUSES], 'name')
+    insert_ignore(Genre, [{'name': name} for name in GENRES], 'name')
+    role_ids = dict(db.session.execute(db.select(Role.name, Role.id)).all())
+    existing = set(db.session.scalars(db.select(User.username).where(User.username.in_([u[0] for u in USERS]))))
+    insert_ignore(User, [
+        {
+            'username': username,
+            'password_hash': generate_password_hash(password, current_app.config['PASSWORD_HASH_METHOD']),
+            'last_name': last_name,
+            'first_name': first_name,
+            'middle_name': middle_name,
+            'role_id': role_ids[role_name]
+        }
+        for username, password, last_name, first_name, middle_name, role_name in USERS
+        if username not in existing and role_name in role_ids
+    ], 'username')
+    db.session.commit()
+
+
+def register_commands(app):
+    """Регистрирует CLI-команды в приложении."""
+
+    @app.cli.command('seed')
+    def seed_command():
+        """Создаёт таблицы и заполняет справочные данные."""
+        db.create_all()
+        seed_reference_data()
+        click.echo('Справочные данные загружены.')
+
+    @app.cli.command('covers-gc')
+    @click.option('--dry-run', is_flag=True, help='Только отчёт, без удаления.')
+    @click.option('--verify/--no-verify', default=True, help='Проверять md5 файлов.')
+    @click.option('--workers', default=4, show_default=True, help='Потоков для проверки md5.')
+    @click.option('--min-age', default=3600, show_default=True, help='Не трогать файлы моложе N секунд.')
+    def covers_gc_command(dry_run, verify, workers, min_age):
+        """Сверяет каталог обложек с таблицей covers и удаляет мусор."""
+        stats = collect_garbage(dry_run=dry_run, verify=verify, workers=workers, min_age=min_age, report=click.echo)
+        click.echo(
+            f"Неиспользуемых обложек: {stats['orphan_rows']}, лишних файлов: {stats['orphan_files']}, "
+            f"отсутствующих файлов: {stats['missing_files']}, "
+            f"проверено md5: {stats['checked']}, расхождений: {stats['hash_mismatches']}"
+        )
+
+    @app.cli.command('covers-dedup')
+    @click.option('--max-distance', type=int, default=None, help='Порог расстояния Хэмминга (по умолчанию PHASH_MAX_DISTANCE).')
+    @click.option('--dry-run', is_flag=True, help='Только отчёт, без объединения.')
+    @click.option('--workers', default=4, show_default=True, help='Потоков для вычисления хешей.')
+    def covers_dedup_command(max_distance, dry_run, workers):
+        """Находит визуально одинаковые обложки и объединяет их."""
+        if max_distance is None:
+            max_distance = app.config['PHASH_MAX_DISTANCE']
+        stats = merge_near_duplicates(max_distance, dry_run=dry_run, workers=workers, report=click.echo)
+        click.echo(
+            f"Вычислено хешей: {stats['hashed']}, малодетальных: {stats['low_detail']}, "
+            f"нечитаемых файлов: {stats['unreadable']}, "
+            f"групп дубликатов: {stats['groups']}, объединено обложек: {stats['merged']}, "
+            f"перенаправлено книг: {stats['books']}"
+        )
+
+    @app.cli.command('outbox-prune')
+    def outbox_prune_command():
+        """Удаляет события журнала изменений, прочитанные всеми потребителями."""
+        click.echo(f'Удалено событий: {outbox.prune()}')
+
+    @app.cli.command('compress-static')
+    @click.option('--force', is_flag=True, help='Пересоздать все сжатые копии.')
+    def compress_static_command(force):
+        """Создаёт .gz/.br-копии текстовых статических файлов."""
+        for path in compress_static_files(app.static_folder, force=force):
+            click.echo(path)
@@ -0,0 +1,150 @@
+"""
+Сжатие ответов (gzip/brotli) и раздача предварительно сжатых статических файлов.
+
+Динамические ответы сжимаются в after_request, если клиент принимает сжатие,
+тип содержимого текстовый и размер не меньше COMPRESS_MIN_SIZE; потоковые ответы
+сжимаются по частям. Для статики команда `flask compress-static` создаёт рядом
+с текстовыми файлами копии .gz/.br, которые отдаются без сжатия на лету.
+Сжатая копия отдаётся, только если она не старше исходника, иначе — сам исходник.
+Brotli используется, только если установлен пакет brotli.
+
+Ответы, в которые в этом запросе попал CSRF-токен Flask-WTF, не сжимаются:
+рядом с токеном в HTML может отражаться ввод из query-string (фильтры каталога),
+и по размеру сжатого ответа токен можно подобрать (атака BREACH).
+"""
+
+import gzip
+import mimetypes
+import os
+import zlib
+from flask import current_app, g, request, send_from_directory
+from werkzeug.http import parse_accept_header
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'text/xml',
+    'application/javascript', 'application/json', 'application/xml', 'image/svg+xml'
+}
+STATIC_EXTENSIONS = {'.css', '.js', '.html', '.txt', '.json', '.svg', '.xml'}
+PRECOMPRESSED = {'br': '.br', 'gzip': '.gz'}
+
+
+def supported_encodings():
+    """Поддерживаемые кодировки в порядке предпочтения."""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+def negotiate(accept_encoding):
+    """Выбирает кодировку по заголовку Accept-Encoding или возвращает None."""
+    return parse_accept_header(accept_encoding or '').best_match(supported_encodings())
+
+def compress(data, encoding, level):
+    """Сжимает байты целиком (уровень 1-9 для gzip; для brotli приводится к quality 0-11)."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(11, level + 2))
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+def _compress_stream(chunks, encoding, level):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=min(11, level + 2))
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        process, flush, finish = compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = process(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def is_compressible(mimetype):
+    """Имеет ли смысл сжимать содержимое такого типа."""
+    return mimetype in COMPRESSIBLE_TYPES
+
+def is_fresh(compressed_mtime, source_mtime):
+    """Не устарела ли сжатая копия относительно исходного файла."""
+    return compressed_mtime >= source_mtime
+
+def carries_csrf_token():
+    """Сгенерирован ли в текущем запросе CSRF-токен (тогда он есть в теле ответа)."""
+    return current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token') in g
+
+
+def compress_response(response):
+    """after_request: сжимает ответ, если клиент это поддерживает."""
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or not is_compressible(response.mimetype) or carries_csrf_token()):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    level = current_app.config['COMPRESS_LEVEL']
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(compress(data, encoding, level))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def precompressed_static(filename):
+    """Раздача статики с подменой на готовые .br/.gz-файлы, если клиент их принимает."""
+    static_folder = current_app.static_folder
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = negotiate(request.headers.get('Accept-Encoding')) if is_compressible(mimetype) else None
+    source = safe_join(static_folder, filename)
+    if encoding is not None and source is not None and os.path.isfile(source):
+        compressed = filename + PRECOMPRESSED[encoding]
+        path = safe_join(static_folder, compressed)
+        if path is not None and os.path.isfile(path) and is_fresh(os.path.getmtime(path), os.path.getmtime(source)):
+            response = send_from_directory(static_folder, compressed, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            return response
+    response = send_from_directory(static_folder, filename)
+    if is_compressible(mimetype):
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+def compress_static_files(folder, force=False):
+    """Создаёт .gz (и .br при наличии brotli) рядом с текстовыми файлами каталога folder.
+
+    Файлы, у которых сжатая копия новее исходника, пропускаются. Возвращает список созданных файлов.
+    """
+    created = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if os.path.splitext(name)[1].lower() not in STATIC_EXTENSIONS:
+                continue
+            source = os.path.join(root, name)
+            with open(source, 'rb') as f:
+                data = None
+                for encoding in supported_encodings():
+                    target = source + PRECOMPRESSED[encoding]
+                    if not force and os.path.exists(target) and is_fresh(os.path.getmtime(target), os.path.getmtime(source)):
+                        continue
+                    if data is None:
+                        data = f.read()
+                    compressed = brotli.compress(data, quality=11) if encoding == 'br' else gzip.compress(data, 9, mtime=0)
+                    if len(compressed) >= len(data):
+                        continue
+                    with open(target, 'wb') as out:
+                        out.write(compressed)
+                    created.append(target)
+    return created
@@ -9,4 +9,29 @@ class Config:
     SECRET_KEY = 'your_secret_key'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///exam.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # URL для async-режима (asgi.py); по умолчанию выводится из SQLALCHEMY_DATABASE_URI
+    ASYNC_DATABASE_URI = None
+    # Алгоритм и стоимость хеширования паролей (формат werkzeug); устаревшие хеши обновляются при входе
+    PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+    PASSWORD_HASH_WORKERS = 2
+    PASSWORD_HASH_QUEUE = 16
+    PASSWORD_HASH_TIMEOUT = 5
+    # Ограничение попыток входа/регистрации за окно LOGIN_RATE_WINDOW секунд
+    LOGIN_RATE_WINDOW = 300
+    LOGIN_RATE_LIMIT_USER = 5
+    LOGIN_RATE_LIMIT_IP = 30
+    RATE_LIMIT_DB = None
+    # Предельная длительность пишущей транзакции (сек): дольше журнал outbox не ждёт пропущенный ID
+    OUTBOX_GAP_TIMEOUT = 30
+    # Индекс автодополнения: строить при старте воркера и как часто догонять изменения других воркеров (сек)
+    SUGGEST_INDEX_PRELOAD = True
+    SUGGEST_SYNC_INTERVAL = 2
+    # Число карточек книг в кеше фрагментов (на процесс) и каталог кеша байткода Jinja
+    FRAGMENT_CACHE_SIZE = 5000
+    JINJA_BYTECODE_CACHE_DIR = None
+    # Сжатие динамических ответов: минимальный размер в байтах и уровень (1-9)
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_LEVEL = 6
+    # Максимальное расстояние Хэмминга между перцептивными хешами (из 64 бит), при котором обложки считаются одинаковыми
+    PHASH_MAX_DISTANCE = 6
     UPLOAD_FOLDER = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'static', 'covers')
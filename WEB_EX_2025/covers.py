@@ -0,0 +1,405 @@
+"""
+Хранилище обложек книг: дедупликация по md5 и перцептивному хешу, подсчёт ссылок
+и сборка мусора.
+
+Файл обложки удаляется только вместе с последней ссылающейся на неё книгой,
+причём физическое удаление выполняется после commit транзакции (а файл новой
+обложки — удаляется при rollback), чтобы каталог и таблица covers не расходились.
+
+Перцептивный хеш (64-битный dHash) совпадает у одной и той же картинки после
+пересжатия или изменения размера. Хеши всех обложек держатся в памяти процесса
+в массиве numpy (PhashIndex), поиск ближайших по расстоянию Хэмминга выполняется
+векторно; изменения из других процессов подтягиваются из журнала outbox.
+У однотонных и почти пустых картинок (фон с надписью) хеш определяется шумом,
+поэтому для них он не сохраняется и похожие не ищутся. Кроме хеша, совпадать
+должны средний цвет и соотношение сторон.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import event, exists, func, select, update
+from sqlalchemy.orm import Session
+from models import db, Book, Cover
+import outbox
+
+GC_BATCH_SIZE = 1000
+PHASH_SIZE = 8
+# Минимум соседних пикселей (из 64), различающихся по яркости хотя бы на PHASH_EDGE_DELTA
+PHASH_MIN_EDGES = 16
+PHASH_EDGE_DELTA = 4
+# Допустимая разница среднего цвета (по каждому каналу) и соотношения сторон (доля)
+COLOR_TOLERANCE = 32
+ASPECT_TOLERANCE = 0.05
+
+ImageSignature = namedtuple('ImageSignature', 'phash color aspect')
+
+
+def md5_for_file(file):
+    """Вычисляет md5-хеш для файла (для проверки уникальности обложки)."""
+    hash_md5 = hashlib.md5()
+    for chunk in iter(lambda: file.read(4096), b""):
+        hash_md5.update(chunk)
+    file.seek(0)
+    return hash_md5.hexdigest()
+
+def md5_for_path(path):
+    """Вычисляет md5-хеш файла на диске."""
+    with open(path, 'rb') as f:
+        return md5_for_file(f)
+
+def image_signature(file):
+    """Вычисляет подпись изображения или None, если файл не читается как картинка.
+
+    phash — 64-битный dHash (16 hex-символов) или None для малодетальной картинки,
+    color — средний цвет (hex RGB), aspect — ширина / высота × 1000.
+    """
+    import numpy as np
+    from PIL import Image
+
+    try:
+        with Image.open(file) as image:
+            width, height = image.size
+            image.draft('RGB', (PHASH_SIZE * 4, PHASH_SIZE * 4))
+            rgb = image.convert('RGB')
+            color = np.asarray(rgb, dtype=np.float64).reshape(-1, 3).mean(axis=0)
+            pixels = np.asarray(
+                rgb.convert('L').resize((PHASH_SIZE + 1, PHASH_SIZE), Image.Resampling.LANCZOS),
+                dtype=np.int16
+            )
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    finally:
+        file.seek(0)
+    diff = pixels[:, 1:] - pixels[:, :-1]
+    phash = None
+    if np.count_nonzero(np.abs(diff) >= PHASH_EDGE_DELTA) >= PHASH_MIN_EDGES:
+        phash = np.packbits(diff > 0).tobytes().hex()
+    return ImageSignature(phash, bytes(np.rint(color).astype(np.uint8)).hex(), width * 1000 // max(height, 1))
+
+def signature_for_path(path):
+    """Вычисляет подпись файла изображения на диске."""
+    try:
+        with open(path, 'rb') as f:
+            return image_signature(f)
+    except FileNotFoundError:
+        return None
+
+def _colors(colors):
+    import numpy as np
+    return np.array([tuple(bytes.fromhex(color)) for color in colors], dtype=np.int16).reshape(-1, 3)
+
+def similar_signatures(colors, aspects, color, aspect):
+    """Маска элементов (массивы средних цветов и соотношений сторон), похожих на color и aspect."""
+    import numpy as np
+    aspects = np.asarray(aspects, dtype=np.int64)
+    return (
+        (np.abs(colors - _colors([color])[0]).max(axis=1) <= COLOR_TOLERANCE)
+        & (np.abs(aspects - aspect) <= ASPECT_TOLERANCE * np.maximum(aspects, aspect))
+    )
+
+def _to_uint64(phashes):
+    import numpy as np
+    return np.fromiter((int(h, 16) for h in phashes), dtype=np.uint64, count=len(phashes))
+
+def hamming_distances(hashes, phash):
+    """Расстояния Хэмминга от phash (uint64) до каждого элемента массива hashes."""
+    import numpy as np
+    diff = hashes ^ np.uint64(phash)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(diff)
+    return np.unpackbits(diff.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+def cover_path(filename):
+    """Путь к файлу обложки в каталоге загрузок."""
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    _remove_files(session.info.pop('covers_remove_on_commit', []))
+    session.info.pop('covers_remove_on_rollback', None)
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    _remove_files(session.info.pop('covers_remove_on_rollback', []))
+    session.info.pop('covers_remove_on_commit', None)
+
+
+class PhashIndex:
+    """Перцептивные хеши всех обложек в памяти процесса для векторного поиска похожих.
+
+    Индекс строится лениво при первом поиске, а перед каждым следующим догоняет
+    события 'cover' из outbox, записанные после последнего просмотренного. Если
+    эти события уже удалены prune(), индекс перестраивается целиком.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = None
+        self._hashes = None
+        self._position = 0
+
+    def _rows(self, ids=None):
+        import numpy as np
+        query = select(Cover.id, Cover.phash).where(Cover.phash.isnot(None))
+        if ids is not None:
+            query = query.where(Cover.id.in_(ids))
+        rows = db.session.execute(query).all()
+        return (np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+                _to_uint64([row[1] for row in rows]))
+
+    def _sync(self):
+        import numpy as np
+        changes = outbox.changes_since('cover', self._position) if self._ids is not None else None
+        if changes is None:
+            self._position = outbox.head()
+            self._ids, self._hashes = self._rows()
+            return
+        self._position, changed = changes
+        if not changed:
+            return
+        keep = ~np.isin(self._ids, changed)
+        ids, hashes = self._rows(changed)
+        self._ids = np.concatenate([self._ids[keep], ids])
+        self._hashes = np.concatenate([self._hashes[keep], hashes])
+
+    def nearest(self, phash, max_distance):
+        """ID обложек с расстоянием Хэмминга до phash не больше max_distance, ближайшие первыми."""
+        import numpy as np
+        with self._lock:
+            self._sync()
+            ids, hashes = self._ids, self._hashes
+        distances = hamming_distances(hashes, int(phash, 16))
+        found = np.flatnonzero(distances <= max_distance)
+        found = found[np.argsort(distances[found], kind='stable')]
+        return ids[found].tolist()
+
+    def clear(self):
+        """Сбрасывает индекс; он будет перестроен при следующем поиске."""
+        with self._lock:
+            self._ids = self._hashes = None
+
+
+def store_cover(file):
+    """Возвращает обложку для загруженного файла: существующую с тем же md5,
+    визуально совпадающую (по перцептивному хешу) или новую."""
+    md5 = md5_for_file(file)
+    cover = Cover.query.filter_by(md5_hash=md5).first()
+    if cover:
+        return cover
+    signature = image_signature(file) or ImageSignature(None, None, None)
+    if signature.phash is not None:
+        index = current_app.extensions['phash_index']
+        for cover_id in index.nearest(signature.phash, current_app.config['PHASH_MAX_DISTANCE']):
+            cover = db.session.get(Cover, cover_id)
+            if cover and cover.avg_color and similar_signatures(
+                    _colors([cover.avg_color]), [cover.aspect], signature.color, signature.aspect)[0]:
+                return cover
+    cover = Cover(
+        filename='', mime_type=file.mimetype, md5_hash=md5,
+        phash=signature.phash, avg_color=signature.color, aspect=signature.aspect
+    )
+    db.session.add(cover)
+    db.session.flush()
+    cover.filename = f"{cover.id}.jpg"
+    path = cover_path(cover.filename)
+    file.save(path)
+    db.session.info.setdefault('covers_remove_on_rollback', []).append(path)
+    outbox.record('cover', cover.id, 'insert')
+    return cover
+
+def release_cover(cover, book_id):
+    """Снимает ссылку книги book_id на обложку.
+
+    Если на обложку больше не ссылается ни одна книга, строка удаляется сразу,
+    а файл — после успешного commit.
+    """
+    if cover is None:
+        return
+    refs = db.session.scalar(
+        select(func.count(Book.id)).where(Book.cover_id == cover.id, Book.id != book_id)
+    )
+    if refs == 0:
+        outbox.record('cover', cover.id, 'delete')
+        db.session.delete(cover)
+        db.session.info.setdefault('covers_remove_on_commit', []).append(cover_path(cover.filename))
+
+
+def collect_garbage(dry_run=False, verify=True, workers=4, min_age=3600, report=print):
+    """Сверяет каталог обложек с таблицей covers и удаляет расхождения.
+
+    - строки covers без ссылающихся книг удаляются вместе с файлами;
+    - файлы без строки в covers старше min_age секунд удаляются;
+    - строки, для которых нет файла, и файлы с несовпадающим md5 попадают в отчёт.
+    Таблица и каталог читаются потоково, md5 проверяется параллельно в workers потоках.
+    Возвращает словарь со счётчиками.
+    """
+    stats = {'orphan_rows': 0, 'orphan_files': 0, 'missing_files': 0, 'hash_mismatches': 0, 'checked': 0}
+
+    unreferenced = (
+        select(Cover.id, Cover.filename)
+        .where(~exists().where(Book.cover_id == Cover.id))
+        .order_by(Cover.id)
+        .limit(GC_BATCH_SIZE)
+    )
+    last_id = 0
+    while True:
+        batch = db.session.execute(unreferenced.where(Cover.id > last_id)).all()
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        for cover_id, filename in batch:
+            report(f'Обложка #{cover_id} ({filename}) не используется')
+        stats['orphan_rows'] += len(batch)
+        if not dry_run:
+            for cover_id, _ in batch:
+                outbox.record('cover', cover_id, 'delete')
+            db.session.execute(Cover.__table__.delete().where(Cover.id.in_([row[0] for row in batch])))
+            db.session.info.setdefault('covers_remove_on_commit', []).extend(cover_path(row[1]) for row in batch)
+            db.session.commit()
+
+    known = set()
+    rows = db.session.execute(
+        select(Cover.id, Cover.filename, Cover.md5_hash).execution_options(yield_per=GC_BATCH_SIZE)
+    )
+    with ThreadPoolExecutor(workers) as executor:
+        for partition in rows.partitions():
+            to_verify = []
+            for cover_id, filename, md5 in partition:
+                known.add(filename)
+                path = cover_path(filename)
+                if not os.path.exists(path):
+                    stats['missing_files'] += 1
+                    report(f'Обложка #{cover_id}: файл {filename} отсутствует')
+                elif verify:
+                    to_verify.append((cover_id, filename, md5, path))
+            if to_verify:
+                actual = executor.map(md5_for_path, [item[3] for item in to_verify])
+                for (cover_id, filename, md5, _), real_md5 in zip(to_verify, actual):
+                    stats['checked'] += 1
+                    if real_md5 != md5:
+                        stats['hash_mismatches'] += 1
+                        report(f'Обложка #{cover_id}: md5 файла {filename} не совпадает ({real_md5} != {md5})')
+
+    deadline = time.time() - min_age
+    with os.scandir(current_app.config['UPLOAD_FOLDER']) as entries:
+        for entry in entries:
+            if entry.name.startswith('.') or not entry.is_file() or entry.name in known:
+                continue
+            if entry.stat().st_mtime > deadline:
+                continue
+            stats['orphan_files'] += 1
+            report(f'Файл {entry.name} не связан ни с одной обложкой')
+            if not dry_run:
+                _remove_files([entry.path])
+    return stats
+
+
+def merge_near_duplicates(max_distance, dry_run=False, workers=4, report=print):
+    """Находит визуально совпадающие обложки и объединяет их.
+
+    Сначала вычисляются недостающие подписи изображений (параллельно в workers потоках),
+    затем обложки группируются: к каждой ещё не объединённой обложке присоединяются
+    все более поздние на расстоянии Хэмминга не больше max_distance с близкими
+    средним цветом и соотношением сторон. Малодетальные обложки не объединяются. Книги
+    перенаправляются на обложку с наименьшим ID, дубликаты удаляются вместе с файлами.
+    Возвращает словарь со счётчиками.
+    """
+    import numpy as np
+
+    stats = {'hashed': 0, 'low_detail': 0, 'unreadable': 0, 'groups': 0, 'merged': 0, 'books': 0}
+
+    missing = (
+        select(Cover.id, Cover.filename)
+        .where(Cover.avg_color.is_(None))
+        .order_by(Cover.id)
+        .limit(GC_BATCH_SIZE)
+    )
+    computed = {}
+    last_id = 0
+    with ThreadPoolExecutor(workers) as executor:
+        while True:
+            batch = db.session.execute(missing.where(Cover.id > last_id)).all()
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            signatures = executor.map(signature_for_path, [cover_path(filename) for _, filename in batch])
+            for (cover_id, filename), signature in zip(batch, signatures):
+                if signature is None:
+                    stats['unreadable'] += 1
+                    report(f'Обложка #{cover_id}: файл {filename} не удалось прочитать как изображение')
+                    continue
+                stats['hashed'] += 1
+                if signature.phash is None:
+                    stats['low_detail'] += 1
+                computed[cover_id] = signature
+                if not dry_run:
+                    db.session.execute(update(Cover).where(Cover.id == cover_id).values(
+                        phash=signature.phash, avg_color=signature.color, aspect=signature.aspect
+                    ))
+                    outbox.record('cover', cover_id, 'update')
+            if not dry_run:
+                db.session.commit()
+
+    rows = [tuple(row) for row in db.session.execute(
+        select(Cover.id, Cover.phash, Cover.avg_color, Cover.aspect, Cover.filename)
+        .where(Cover.phash.isnot(None), Cover.avg_color.isnot(None))
+        .order_by(Cover.id)
+    )]
+    if dry_run:
+        # В режиме отчёта вычисленные подписи в базу не записаны
+        rows.extend(
+            (cover_id, signature.phash, signature.color, signature.aspect, None)
+            for cover_id, signature in computed.items() if signature.phash is not None
+        )
+        rows.sort(key=lambda row: row[0])
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    hashes = _to_uint64([row[1] for row in rows])
+    colors = _colors([row[2] for row in rows])
+    aspects = np.fromiter((row[3] for row in rows), dtype=np.int64, count=len(rows))
+    filenames = {row[0]: row[4] for row in rows}
+    merged = np.zeros(len(rows), dtype=bool)
+
+    for i in range(len(rows)):
+        if merged[i]:
+            continue
+        close = np.flatnonzero(
+            ~merged[i + 1:]
+            & (hamming_distances(hashes[i + 1:], hashes[i]) <= max_distance)
+            & similar_signatures(colors[i + 1:], aspects[i + 1:], rows[i][2], rows[i][3])
+        )
+        if close.size == 0:
+            continue
+        close += i + 1
+        merged[close] = True
+        keep, duplicates = int(ids[i]), ids[close].tolist()
+        stats['groups'] += 1
+        stats['merged'] += len(duplicates)
+        report(f'Обложка #{keep}: дубликаты {", ".join(f"#{d}" for d in duplicates)}')
+        if dry_run:
+            continue
+        book_ids = db.session.scalars(select(Book.id).where(Book.cover_id.in_(duplicates))).all()
+        db.session.execute(
+            update(Book).where(Book.cover_id.in_(duplicates)).values(cover_id=keep, version=Book.version + 1)
+        )
+        outbox.record_books(book_ids, 'update')
+        stats['books'] += len(book_ids)
+        for duplicate in duplicates:
+            outbox.record('cover', duplicate, 'delete')
+        db.session.execute(Cover.__table__.delete().where(Cover.id.in_(duplicates)))
+        db.session.info.setdefault('covers_remove_on_commit', []).extend(
+            cover_path(filenames[d]) for d in duplicates
+        )
+        db.session.commit()
+    return stats
@@ -9,7 +9,7 @@ CREATE TABLE roles (
 CREATE TABLE users (
     id INT AUTO_INCREMENT PRIMARY KEY,
     username VARCHAR(64) NOT NULL UNIQUE,
-    password_hash VARCHAR(128) NOT NULL,
+    password_hash VARCHAR(255) NOT NULL,
     last_name VARCHAR(64) NOT NULL,
     first_name VARCHAR(64) NOT NULL,
     middle_name VARCHAR(64),
@@ -30,6 +30,7 @@ CREATE TABLE books (
     publisher VARCHAR(128) NOT NULL,
     author VARCHAR(128) NOT NULL,
     pages INT NOT NULL,
+    version INT NOT NULL DEFAULT 1,
     cover_id INT,
     FOREIGN KEY (cover_id) REFERENCES covers(id) ON DELETE SET NULL
 );
@@ -46,7 +47,10 @@ CREATE TABLE covers (
     id INT AUTO_INCREMENT PRIMARY KEY,
     filename VARCHAR(255) NOT NULL,
     mime_type VARCHAR(64) NOT NULL,
-    md5_hash VARCHAR(32) NOT NULL UNIQUE
+    md5_hash VARCHAR(32) NOT NULL UNIQUE,
+    phash VARCHAR(16),
+    avg_color VARCHAR(6),
+    aspect INT
 );
 
 CREATE TABLE review_statuses (
@@ -68,6 +72,23 @@ CREATE TABLE reviews (
     UNIQUE (book_id, user_id)
 );
 
+CREATE INDEX ix_reviews_book_status_id ON reviews (book_id, status_id, id);
+CREATE INDEX ix_reviews_book_status_rating_id ON reviews (book_id, status_id, rating, id);
+
+CREATE TABLE outbox (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    entity VARCHAR(32) NOT NULL,
+    entity_id INT NOT NULL,
+    op VARCHAR(16) NOT NULL,
+    version INT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+CREATE TABLE outbox_checkpoints (
+    consumer VARCHAR(64) PRIMARY KEY,
+    last_event_id INT NOT NULL
+);
+
 INSERT INTO roles (name, description) VALUES
 ('admin', 'Администратор: полный доступ'),
 ('moderator', 'Модератор: редактирование книг, модерация рецензий'),
@@ -39,3 +39,22 @@ class RegisterForm(FlaskForm):
     first_name = StringField('Имя', validators=[DataRequired(), Length(max=64)])
     middle_name = StringField('Отчество', validators=[Length(max=64)])
     submit = SubmitField('Зарегистрироваться')
+
+class UserEditForm(FlaskForm):
+    """Форма редактирования пользователя (для администратора)."""
+    last_name = StringField('Фамилия', validators=[DataRequired(), Length(max=64)])
+    first_name = StringField('Имя', validators=[DataRequired(), Length(max=64)])
+    middle_name = StringField('Отчество', validators=[Length(max=64)])
+    role_id = SelectField('Роль', coerce=int)
+    password = PasswordField('Новый пароль')
+    submit = SubmitField('Сохранить')
+
+class UserAddForm(FlaskForm):
+    """Форма добавления пользователя (для администратора)."""
+    username = StringField('Логин', validators=[DataRequired(), Length(max=64)])
+    password = PasswordField('Пароль', validators=[DataRequired(), Length(min=4)])
+    last_name = StringField('Фамилия', validators=[DataRequired(), Length(max=64)])
+    first_name = StringField('Имя', validators=[DataRequired(), Length(max=64)])
+    middle_name = StringField('Отчество', validators=[Length(max=64)])
+    role_id = SelectField('Роль', coerce=int)
+    submit = SubmitField('Добавить')
@@ -0,0 +1,56 @@
+"""
+Кеш отрендеренных HTML-фрагментов (карточек книг) с вытеснением по LRU.
+
+Ключ фрагмента — шаблон, ID книги, Book.version и роль текущего пользователя
+(от неё зависят кнопки действий). Book.version увеличивается при редактировании
+книги и при изменении набора одобренных рецензий, поэтому устаревшие записи
+просто перестают запрашиваться и со временем вытесняются.
+"""
+
+import threading
+from collections import OrderedDict
+from flask import current_app, render_template
+from flask_login import current_user
+from markupsafe import Markup
+
+
+class FragmentCache:
+    """Потокобезопасный LRU-кеш ограниченного размера."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Возвращает значение по ключу (или None) и отмечает его как недавно использованное."""
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Сохраняет значение, вытесняя самые давно использованные записи при переполнении."""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Очищает кеш."""
+        with self._lock:
+            self._data.clear()
+
+
+def book_card(template, book):
+    """Jinja-функция: рендерит карточку книги из шаблона template с кешированием."""
+    cache = current_app.extensions['fragment_cache']
+    role = current_user.role.name if current_user.is_authenticated else None
+    key = (template, book.id, book.version, role)
+    html = cache.get(key)
+    if html is None:
+        html = Markup(render_template(template, book=book))
+        cache.set(key, html)
+    return html
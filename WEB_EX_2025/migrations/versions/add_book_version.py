@@ -0,0 +1,19 @@
+"""
+Миграция Alembic: добавляет в books счётчик версий для инвалидации кеша карточек.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_book_version'
+down_revision = 'widen_password_hash'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('books') as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+def downgrade():
+    with op.batch_alter_table('books') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,19 @@
+"""
+Миграция Alembic: добавляет в covers перцептивный хеш для поиска похожих обложек.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_cover_phash'
+down_revision = 'add_outbox'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('covers') as batch_op:
+        batch_op.add_column(sa.Column('phash', sa.String(16)))
+
+def downgrade():
+    with op.batch_alter_table('covers') as batch_op:
+        batch_op.drop_column('phash')
@@ -0,0 +1,23 @@
+"""
+Миграция Alembic: средний цвет и соотношение сторон обложек для проверки похожих по перцептивному хешу.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_cover_signature'
+down_revision = 'books_autoincrement'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('covers') as batch_op:
+        batch_op.add_column(sa.Column('avg_color', sa.String(6)))
+        batch_op.add_column(sa.Column('aspect', sa.Integer()))
+    # Прежние хеши считались и для малодетальных картинок; flask covers-dedup пересчитает их
+    op.execute('UPDATE covers SET phash = NULL')
+
+def downgrade():
+    with op.batch_alter_table('covers') as batch_op:
+        batch_op.drop_column('aspect')
+        batch_op.drop_column('avg_color')
@@ -0,0 +1,31 @@
+"""
+Миграция Alembic: таблицы журнала изменений (outbox) и позиций его потребителей.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_outbox'
+down_revision = 'add_book_version'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'outbox',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('entity', sa.String(32), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('op', sa.String(16), nullable=False),
+        sa.Column('version', sa.Integer()),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False)
+    )
+    op.create_table(
+        'outbox_checkpoints',
+        sa.Column('consumer', sa.String(64), primary_key=True),
+        sa.Column('last_event_id', sa.Integer(), nullable=False)
+    )
+
+def downgrade():
+    op.drop_table('outbox_checkpoints')
+    op.drop_table('outbox')
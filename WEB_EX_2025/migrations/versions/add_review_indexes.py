@@ -0,0 +1,18 @@
+"""
+Миграция Alembic: индексы reviews под keyset-пагинацию одобренных рецензий книги.
+"""
+
+from alembic import op
+
+revision = 'add_review_indexes'
+down_revision = 'outbox_autoincrement'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index('ix_reviews_book_status_id', 'reviews', ['book_id', 'status_id', 'id'])
+    op.create_index('ix_reviews_book_status_rating_id', 'reviews', ['book_id', 'status_id', 'rating', 'id'])
+
+def downgrade():
+    op.drop_index('ix_reviews_book_status_rating_id', table_name='reviews')
+    op.drop_index('ix_reviews_book_status_id', table_name='reviews')
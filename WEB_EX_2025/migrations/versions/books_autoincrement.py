@@ -0,0 +1,27 @@
+"""
+Миграция Alembic: books в SQLite с AUTOINCREMENT, чтобы ID удалённых книг не выдавались повторно.
+"""
+
+from alembic import op
+
+revision = 'books_autoincrement'
+down_revision = 'add_review_indexes'
+branch_labels = None
+depends_on = None
+
+def _recreate_books(autoincrement):
+    # resolve_fks=False: внешние ключи копируются как есть, без отражения связанных таблиц
+    with op.batch_alter_table(
+        'books', recreate='always',
+        table_kwargs={'sqlite_autoincrement': autoincrement},
+        reflect_kwargs={'resolve_fks': False}
+    ):
+        pass
+
+def upgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        _recreate_books(True)
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        _recreate_books(False)
@@ -0,0 +1,29 @@
+"""
+Миграция Alembic: outbox в SQLite с AUTOINCREMENT, чтобы ID событий не повторялись после очистки.
+"""
+
+from alembic import op
+
+revision = 'outbox_autoincrement'
+down_revision = 'add_cover_phash'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('outbox', recreate='always', table_kwargs={'sqlite_autoincrement': True}):
+        pass
+    # Если журнал уже был очищен, нумерация должна продолжиться после позиций потребителей
+    op.execute("DELETE FROM sqlite_sequence WHERE name = 'outbox'")
+    op.execute(
+        "INSERT INTO sqlite_sequence (name, seq) VALUES ('outbox', max("
+        "(SELECT coalesce(max(id), 0) FROM outbox), "
+        "(SELECT coalesce(max(last_event_id), 0) FROM outbox_checkpoints)))"
+    )
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('outbox', recreate='always', table_kwargs={'sqlite_autoincrement': False}):
+        pass
@@ -0,0 +1,19 @@
+"""
+Миграция Alembic: расширяет users.password_hash до 255 символов (хеши scrypt/pbkdf2 длиннее 128).
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'widen_password_hash'
+down_revision = 'add_cover_id'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('password_hash', existing_type=sa.String(128), type_=sa.String(255), existing_nullable=False)
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('password_hash', existing_type=sa.String(255), type_=sa.String(128), existing_nullable=False)
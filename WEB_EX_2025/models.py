@@ -21,7 +21,7 @@ class User(UserMixin, db.Model):
     __tablename__ = 'users'
     id: int = db.Column(db.Integer, primary_key=True)
     username: str = db.Column(db.String(64), unique=True, nullable=False)
-    password_hash: str = db.Column(db.String(128), nullable=False)
+    password_hash: str = db.Column(db.String(255), nullable=False)
     last_name: str = db.Column(db.String(64), nullable=False)
     first_name: str = db.Column(db.String(64), nullable=False)
     middle_name: str = db.Column(db.String(64))
@@ -39,6 +39,8 @@ class Genre(db.Model):
 class Book(db.Model):
     """Модель книги."""
     __tablename__ = 'books'
+    # ID удалённых книг не выдаются повторно: по (id, version) кешируются карточки книг
+    __table_args__ = {'sqlite_autoincrement': True}
     id: int = db.Column(db.Integer, primary_key=True)
     title: str = db.Column(db.String(255), nullable=False)
     description: str = db.Column(db.Text, nullable=False)
@@ -46,6 +48,7 @@ class Book(db.Model):
     publisher: str = db.Column(db.String(128), nullable=False)
     author: str = db.Column(db.String(128), nullable=False)
     pages: int = db.Column(db.Integer, nullable=False)
+    version: int = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     genres = db.relationship('Genre', secondary='books_genres', back_populates='books')
     cover_id: int = db.Column(db.Integer, db.ForeignKey('covers.id', ondelete='SET NULL'))
     cover = db.relationship('Cover', backref='books', foreign_keys=[cover_id])
@@ -65,6 +68,9 @@ class Cover(db.Model):
     filename: str = db.Column(db.String(255), nullable=False)
     mime_type: str = db.Column(db.String(64), nullable=False)
     md5_hash: str = db.Column(db.String(32), nullable=False, unique=True)
+    phash: str = db.Column(db.String(16))
+    avg_color: str = db.Column(db.String(6))
+    aspect: int = db.Column(db.Integer)
 
 class ReviewStatus(db.Model):
     """Модель статуса рецензии (pending, approved, rejected)."""
@@ -83,7 +89,12 @@ class Review(db.Model):
     text: str = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False)
     status_id: int = db.Column(db.Integer, db.ForeignKey('review_statuses.id'), nullable=False)
-    __table_args__ = (db.UniqueConstraint('book_id', 'user_id', name='_book_user_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('book_id', 'user_id', name='_book_user_uc'),
+        # Индексы под keyset-пагинацию одобренных рецензий (sort=new и sort=rating)
+        db.Index('ix_reviews_book_status_id', 'book_id', 'status_id', 'id'),
+        db.Index('ix_reviews_book_status_rating_id', 'book_id', 'status_id', 'rating', 'id'),
+    )
 
 class Collection(db.Model):
     """Модель подборки книг пользователя."""
@@ -98,3 +109,21 @@ class CollectionBook(db.Model):
     __tablename__ = 'collections_books'
     collection_id = db.Column(db.Integer, db.ForeignKey('collections.id', ondelete='CASCADE'), primary_key=True)
     book_id = db.Column(db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), primary_key=True)
+
+class OutboxEvent(db.Model):
+    """Событие журнала изменений (outbox), пишется в одной транзакции с изменением."""
+    __tablename__ = 'outbox'
+    # Без AUTOINCREMENT SQLite повторно выдаёт ID после очистки таблицы, и потребители пропускают события
+    __table_args__ = {'sqlite_autoincrement': True}
+    id: int = db.Column(db.Integer, primary_key=True)
+    entity: str = db.Column(db.String(32), nullable=False)
+    entity_id: int = db.Column(db.Integer, nullable=False)
+    op: str = db.Column(db.String(16), nullable=False)
+    version: int = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False)
+
+class OutboxCheckpoint(db.Model):
+    """Позиция потребителя в журнале изменений."""
+    __tablename__ = 'outbox_checkpoints'
+    consumer: str = db.Column(db.String(64), primary_key=True)
+    last_event_id: int = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,166 @@
+"""
+Журнал изменений (transactional outbox) для производных индексов и кешей.
+
+Маршруты, изменяющие данные, добавляют в таблицу outbox компактное событие
+(сущность, ID, операция, версия) в той же транзакции, что и само изменение,
+поэтому событие появляется тогда и только тогда, когда изменение закоммичено.
+Потребители читают журнал пачками от своей сохранённой позиции (OutboxConsumer).
+
+На серверных БД (PostgreSQL, MySQL) транзакция может получить меньший ID, а
+закоммититься позже соседних, поэтому пропуск в ID означает событие, которое
+ещё может появиться. Чтение останавливается на первом таком пропуске, пока
+событие после него не станет старше 2 × OUTBOX_GAP_TIMEOUT по часам БД:
+пишущие транзакции короче OUTBOX_GAP_TIMEOUT к этому времени завершены,
+и пропуск остаётся только от отката. В SQLite записи последовательны,
+пропусков нет. Граница очистки журнала (prune) хранится отдельно, чтобы
+удалённые события не принимались за незавершённые.
+"""
+
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import func, insert, literal, select
+from models import db, Book, OutboxEvent, OutboxCheckpoint
+
+# Служебная позиция в outbox_checkpoints: до какого ID журнал очищен prune()
+PRUNED = '~pruned'
+
+
+def record(entity, entity_id, op, version=None):
+    """Добавляет событие в текущую транзакцию."""
+    db.session.add(OutboxEvent(entity=entity, entity_id=entity_id, op=op, version=version))
+
+def record_books(book_ids, op='update'):
+    """Добавляет события по книгам одним INSERT ... SELECT с их текущими Book.version.
+
+    book_ids — список ID или подзапрос, возвращающий ID книг.
+    """
+    db.session.flush()
+    db.session.execute(
+        insert(OutboxEvent).from_select(
+            ['entity', 'entity_id', 'op', 'version'],
+            select(literal('book'), Book.id, literal(op), Book.version).where(Book.id.in_(book_ids))
+        )
+    )
+
+
+def pruned_through():
+    """ID, до которого (включительно) события удалены prune()."""
+    return db.session.scalar(
+        select(OutboxCheckpoint.last_event_id).where(OutboxCheckpoint.consumer == PRUNED)
+    ) or 0
+
+def _gap_cutoff():
+    now = db.session.scalar(select(func.now()))
+    if now.tzinfo is not None:
+        # created_at хранится без часового пояса, во времени сессии БД
+        now = now.replace(tzinfo=None)
+    return now - timedelta(seconds=2 * current_app.config['OUTBOX_GAP_TIMEOUT'])
+
+def settled(rows, after_id):
+    """Оставляет из событий rows (по возрастанию ID, после after_id) те, что идут до первого
+    пропуска, за которым ещё может закоммититься событие с меньшим ID."""
+    expected = after_id + 1
+    cutoff = pruned = None
+    for i, row in enumerate(rows):
+        if row.id != expected:
+            if pruned is None:
+                pruned = pruned_through()
+            if row.id - 1 > pruned:
+                if cutoff is None:
+                    cutoff = _gap_cutoff()
+                if row.created_at > cutoff:
+                    return rows[:i]
+        expected = row.id + 1
+    return rows
+
+def head():
+    """Позиция для индекса в памяти, который строится заново: все события до неё видны."""
+    after = pruned_through()
+    rows = db.session.execute(
+        select(OutboxEvent.id, OutboxEvent.created_at).where(OutboxEvent.id > after).order_by(OutboxEvent.id)
+    ).all()
+    rows = settled(rows, after)
+    return rows[-1].id if rows else after
+
+def changes_since(entity, after_id):
+    """ID сущностей entity, изменённых после события after_id, для индексов в памяти процесса.
+
+    Возвращает пару (новая позиция, список ID) или None, если часть событий после
+    after_id уже удалена prune() и индекс нужно перестроить целиком.
+    """
+    if after_id < pruned_through():
+        return None
+    rows = settled(db.session.execute(
+        select(OutboxEvent.id, OutboxEvent.created_at, OutboxEvent.entity, OutboxEvent.entity_id)
+        .where(OutboxEvent.id > after_id)
+        .order_by(OutboxEvent.id)
+    ).all(), after_id)
+    if not rows:
+        return after_id, []
+    return rows[-1].id, list(dict.fromkeys(row.entity_id for row in rows if row.entity == entity))
+
+
+class OutboxConsumer:
+    """Потребитель журнала изменений с сохраняемой в БД позицией.
+
+    Пример:
+        for events in OutboxConsumer('search-index'):
+            index.apply(events)
+    Позиция сдвигается после обработки каждой пачки (когда итерация продолжается).
+    Итерация заканчивается и на пропуске ID, который ещё может заполниться (см. settled).
+    """
+
+    def __init__(self, name, batch_size=500):
+        self.name = name
+        self.batch_size = batch_size
+
+    def checkpoint(self):
+        """ID последнего обработанного события."""
+        return db.session.scalar(
+            select(OutboxCheckpoint.last_event_id).where(OutboxCheckpoint.consumer == self.name)
+        ) or 0
+
+    def fetch(self, after_id=None):
+        """Следующая пачка событий после after_id (по умолчанию — после сохранённой позиции)."""
+        if after_id is None:
+            after_id = self.checkpoint()
+        return settled(db.session.scalars(
+            select(OutboxEvent).where(OutboxEvent.id > after_id).order_by(OutboxEvent.id).limit(self.batch_size)
+        ).all(), after_id)
+
+    def ack(self, last_event_id):
+        """Сохраняет позицию потребителя."""
+        checkpoint = db.session.get(OutboxCheckpoint, self.name)
+        if checkpoint is None:
+            db.session.add(OutboxCheckpoint(consumer=self.name, last_event_id=last_event_id))
+        else:
+            checkpoint.last_event_id = max(checkpoint.last_event_id, last_event_id)
+        db.session.commit()
+
+    def __iter__(self):
+        after_id = self.checkpoint()
+        while True:
+            events = self.fetch(after_id)
+            if not events:
+                return
+            yield events
+            after_id = events[-1].id
+            self.ack(after_id)
+
+
+def prune():
+    """Удаляет события, уже прочитанные всеми потребителями; возвращает число удалённых.
+
+    Последнее событие не удаляется никогда: по нему база продолжает нумерацию
+    даже там, где счётчик автоинкремента может сброситься к max(id) + 1.
+    """
+    low = db.session.scalar(
+        select(func.min(OutboxCheckpoint.last_event_id)).where(OutboxCheckpoint.consumer != PRUNED)
+    )
+    if low is None:
+        return 0
+    newest = db.session.scalar(select(func.max(OutboxEvent.id))) or 0
+    boundary = min(low, newest - 1)
+    deleted = db.session.execute(OutboxEvent.__table__.delete().where(OutboxEvent.id <= boundary)).rowcount
+    OutboxConsumer(PRUNED).ack(boundary)
+    return deleted
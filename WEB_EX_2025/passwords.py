@@ -0,0 +1,114 @@
+"""
+Хеширование паролей вне потока запроса и ограничение частоты попыток входа.
+
+PasswordHasher выполняет generate/check_password_hash в ограниченном пуле потоков
+с лимитом на длину очереди, LoginRateLimiter считает попытки по логину и IP
+в локальной SQLite-базе, общей для всех воркеров на одном хосте.
+"""
+
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasherBusy(Exception):
+    """Очередь хеширования паролей переполнена."""
+
+
+class PasswordHasher:
+    """Хеширование паролей в ограниченном пуле потоков с прозрачным обновлением хешей."""
+
+    def __init__(self, method, workers, queue_size, timeout):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._prefix = None
+
+    def _submit(self, fn, *args):
+        # Пул создаётся лениво, чтобы потоки не появлялись до fork воркеров
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password-hash')
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PasswordHasherBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def hash(self, password):
+        """Возвращает хеш пароля по настроенному алгоритму."""
+        return self._submit(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """Проверяет пароль по хешу."""
+        return self._submit(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Проверяет, отличаются ли алгоритм и параметры хеша от настроенных."""
+        if self._prefix is None:
+            self._prefix = self._submit(generate_password_hash, '', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._prefix
+
+    def verify_and_update(self, password_hash, password):
+        """Проверяет пароль; при успехе и устаревшем хеше возвращает новый хеш вторым элементом."""
+        if not self.verify(password_hash, password):
+            return False, None
+        if self.needs_rehash(password_hash):
+            return True, self.hash(password)
+        return True, None
+
+
+class LoginRateLimiter:
+    """Ограничение числа попыток в фиксированном окне времени, хранилище — локальная SQLite."""
+
+    def __init__(self, path, window):
+        self.path = path
+        self.window = window
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS attempts ('
+                'key TEXT PRIMARY KEY, window_start INTEGER NOT NULL, count INTEGER NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_attempts_window ON attempts (window_start)')
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key, limit):
+        """Регистрирует попытку; возвращает False, если лимит в текущем окне исчерпан."""
+        now = int(time.time())
+        window_start = now - now % self.window
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM attempts WHERE window_start < ?', (window_start,))
+            conn.execute(
+                'INSERT INTO attempts (key, window_start, count) VALUES (?, ?, 1) '
+                'ON CONFLICT(key) DO UPDATE SET count = count + 1',
+                (key, window_start)
+            )
+            count = conn.execute('SELECT count FROM attempts WHERE key = ?', (key,)).fetchone()[0]
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return count <= limit
+
+    def reset(self, key):
+        """Сбрасывает счётчик попыток для ключа (например, после успешного входа)."""
+        self._connection().execute('DELETE FROM attempts WHERE key = ?', (key,))
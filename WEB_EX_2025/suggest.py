@@ -0,0 +1,123 @@
+"""
+In-memory префиксный индекс для автодополнения названий и авторов книг.
+Хранит отсортированный массив нормализованных ключей и параллельный массив ID книг,
+поиск выполняется бинарным поиском (bisect) без обращения к базе данных.
+Индекс строится при старте воркера, а изменения, сделанные другими воркерами,
+применяются по событиям 'book' журнала outbox начиная с сохранённой позиции.
+"""
+
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+
+def normalize(text):
+    """Приводит строку к виду для поиска: нижний регистр, ё -> е, схлопнутые пробелы."""
+    return ' '.join((text or '').casefold().replace('ё', 'е').split())
+
+
+def _keys_for(text):
+    """Возвращает ключи индекса: строку целиком и её суффиксы, начинающиеся с каждого слова."""
+    words = normalize(text).split(' ')
+    return {sys.intern(' '.join(words[i:])) for i in range(len(words)) if words[i]}
+
+
+class SuggestIndex:
+    """Префиксный индекс по названиям и авторам книг."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._ids = array('i')
+        self._books = {}
+        self.ready = False
+        self.position = 0
+        self.synced_at = 0.0
+        self.sync_lock = threading.Lock()
+
+    def build(self, books, position=0):
+        """Полностью перестраивает индекс по итерируемому набору книг.
+
+        position — ID последнего события outbox, уже отражённого в books.
+        """
+        pairs = []
+        labels = {}
+        for book in books:
+            labels[book.id] = (sys.intern(book.title), sys.intern(book.author))
+            pairs.extend((key, book.id) for key in _keys_for(book.title) | _keys_for(book.author))
+        pairs.sort()
+        with self._lock:
+            self._keys = [key for key, _ in pairs]
+            self._ids = array('i', (book_id for _, book_id in pairs))
+            self._books = labels
+            self.ready = True
+            self.position = position
+            self.synced_at = time.monotonic()
+
+    def _remove_locked(self, book_id):
+        labels = self._books.pop(book_id, None)
+        if labels is None:
+            return
+        for key in _keys_for(labels[0]) | _keys_for(labels[1]):
+            pos = bisect_left(self._keys, key)
+            while pos < len(self._keys) and self._keys[pos] == key:
+                if self._ids[pos] == book_id:
+                    del self._keys[pos]
+                    del self._ids[pos]
+                    break
+                pos += 1
+
+    def add(self, book):
+        """Добавляет книгу в индекс (или обновляет, если она уже есть)."""
+        with self._lock:
+            self._remove_locked(book.id)
+            self._books[book.id] = (sys.intern(book.title), sys.intern(book.author))
+            for key in _keys_for(book.title) | _keys_for(book.author):
+                pos = bisect_left(self._keys, key)
+                while pos < len(self._keys) and self._keys[pos] == key and self._ids[pos] < book.id:
+                    pos += 1
+                self._keys.insert(pos, key)
+                self._ids.insert(pos, book.id)
+
+    def remove(self, book_id):
+        """Удаляет книгу из индекса."""
+        with self._lock:
+            self._remove_locked(book_id)
+
+    def sync_due(self, interval):
+        """Прошло ли с последней синхронизации больше interval секунд."""
+        return time.monotonic() - self.synced_at >= interval
+
+    def apply(self, position, book_ids, books):
+        """Применяет изменения книг book_ids: books — их текущие строки, отсутствующие удаляются."""
+        found = set()
+        for book in books:
+            found.add(book.id)
+            self.add(book)
+        for book_id in book_ids:
+            if book_id not in found:
+                self.remove(book_id)
+        self.position = max(self.position, position)
+        self.synced_at = time.monotonic()
+
+    def search(self, query, limit=10):
+        """Возвращает до limit книг, у которых название или автор начинается с query."""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        result = []
+        seen = set()
+        with self._lock:
+            pos = bisect_left(self._keys, prefix)
+            while pos < len(self._keys) and len(result) < limit:
+                if not self._keys[pos].startswith(prefix):
+                    break
+                book_id = self._ids[pos]
+                if book_id not in seen:
+                    seen.add(book_id)
+                    title, author = self._books[book_id]
+                    result.append({'id': book_id, 'title': title, 'author': author})
+                pos += 1
+        return result
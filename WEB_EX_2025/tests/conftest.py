@@ -0,0 +1,22 @@
+import pytest
+from app import create_app
+from models import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Изолированное приложение на SQLite в памяти с созданными таблицами."""
+    app = create_app(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI='sqlite://',
+        WTF_CSRF_ENABLED=False,
+        RATE_LIMIT_DB=str(tmp_path / 'ratelimit.db'),
+        UPLOAD_FOLDER=str(tmp_path / 'covers'),
+        JINJA_BYTECODE_CACHE_DIR=str(tmp_path / 'jinja_cache'),
+        PASSWORD_HASH_METHOD='pbkdf2:sha256:1000'
+    )
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,72 @@
+import re
+import pytest
+from starlette.testclient import TestClient
+from app import create_app
+from asgi import create_asgi_app
+from commands import seed_reference_data
+from models import db, Book, Genre
+
+
+@pytest.fixture
+def flask_app(tmp_path):
+    """Приложение на файловой SQLite: async-движок ASGI-части должен видеть те же данные."""
+    app = create_app(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / "exam.db"}',
+        WTF_CSRF_ENABLED=False,
+        RATE_LIMIT_DB=str(tmp_path / 'ratelimit.db'),
+        UPLOAD_FOLDER=str(tmp_path / 'covers'),
+        JINJA_BYTECODE_CACHE_DIR=str(tmp_path / 'jinja_cache'),
+        PASSWORD_HASH_METHOD='pbkdf2:sha256:1000'
+    )
+    with app.app_context():
+        db.create_all()
+        seed_reference_data()
+        genres = db.session.scalars(db.select(Genre).order_by(Genre.id).limit(2)).all()
+        for i in range(3):
+            book = Book(title=f'Книга {i}', description='d', year=2000 + i, publisher='p', author='a', pages=100)
+            book.genres = genres if i < 2 else genres[:1]
+            db.session.add(book)
+        db.session.commit()
+    yield app
+
+
+@pytest.fixture
+def client(flask_app):
+    with TestClient(create_asgi_app(flask_app), follow_redirects=False) as client:
+        yield client
+
+
+def titles(html):
+    return re.findall(r'Книга \d', html)
+
+
+def flashes(html):
+    return re.findall(r'<li class="[^"]*">(.*?)</li>', html, re.S)
+
+
+def test_genre_filter_has_no_duplicates(flask_app, client):
+    query = '/?genre=1&genre=2'
+    asgi_titles = titles(client.get(query).text)
+    wsgi_titles = titles(flask_app.test_client().get(query).get_data(as_text=True))
+    assert sorted(asgi_titles) == sorted(set(asgi_titles)) == ['Книга 0', 'Книга 1', 'Книга 2']
+    assert asgi_titles == wsgi_titles
+
+
+def test_bad_page_is_404(flask_app, client):
+    assert client.get('/?page=0').status_code == 404
+    assert client.get('/?page=-3').status_code == 404
+    assert client.get('/?page=99').status_code == 404
+    assert flask_app.test_client().get('/?page=0').status_code == 404
+
+
+def test_flash_is_shown_once_on_asgi_page(client):
+    assert client.post('/login', data={'username': 'user', 'password': 'user'}).status_code == 302
+    response = client.get('/users')
+    assert response.status_code == 302
+    assert flashes(client.get('/').text) == ['У вас недостаточно прав для выполнения данного действия']
+    assert flashes(client.get('/').text) == []
+
+
+def test_suggest(client):
+    assert [item['title'] for item in client.get('/api/suggest?q=книга 1').json()] == ['Книга 1']
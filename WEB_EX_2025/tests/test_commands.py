@@ -0,0 +1,20 @@
+from commands import GENRES, REVIEW_STATUSES, ROLES, USERS
+from models import db, Genre, ReviewStatus, Role, User
+
+
+def counts():
+    return [db.session.scalar(db.select(db.func.count()).select_from(model)) for model in (Role, ReviewStatus, Genre, User)]
+
+
+def test_seed_is_idempotent(app):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['seed'])
+    assert result.exit_code == 0, result.output
+    expected = [len(ROLES), len(REVIEW_STATUSES), len(GENRES), len(USERS)]
+    assert counts() == expected
+    password_hash = db.session.scalar(db.select(User.password_hash).where(User.username == 'admin'))
+
+    result = runner.invoke(args=['seed'])
+    assert result.exit_code == 0, result.output
+    assert counts() == expected
+    assert db.session.scalar(db.select(User.password_hash).where(User.username == 'admin')) == password_hash
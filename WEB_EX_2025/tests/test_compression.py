@@ -0,0 +1,89 @@
+import gzip
+import os
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+from asgi import PrecompressedStaticFiles
+from compression import compress_static_files, negotiate
+from models import db, Book
+
+CSS = b'body { color: black; }\n' * 100
+
+
+@pytest.fixture
+def static_folder(app, tmp_path, monkeypatch):
+    folder = tmp_path / 'static'
+    folder.mkdir()
+    (folder / 'style.css').write_bytes(CSS)
+    monkeypatch.setattr(app, 'static_folder', str(folder))
+    return folder
+
+
+def make_stale(folder):
+    """Исходник изменён после compress-static: сжатые копии старше него."""
+    (folder / 'style.css').write_bytes(CSS + b'a { color: red; }\n')
+    for name in os.listdir(folder):
+        os.utime(folder / name, (1000, 1000) if name != 'style.css' else (2000, 2000))
+
+
+def test_negotiate():
+    assert negotiate('gzip;q=1.0, identity') == 'gzip'
+    assert negotiate('identity') is None
+    assert negotiate(None) is None
+
+
+def test_dynamic_response_is_compressed(app):
+    for i in range(5):
+        db.session.add(Book(title=f'Книга {i}', description='d', year=2000, publisher='p', author='a', pages=1))
+    db.session.commit()
+    client = app.test_client()
+    plain = client.get('/').get_data()
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.get_data()) == plain
+
+
+def test_pages_with_csrf_token_are_not_compressed(app):
+    app.config['WTF_CSRF_ENABLED'] = True
+    response = app.test_client().get('/login?next=/', headers={'Accept-Encoding': 'gzip'})
+    assert 'csrf_token' in response.get_data(as_text=True)
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_compress_static_files_skips_fresh_copies(static_folder):
+    created = compress_static_files(str(static_folder))
+    assert str(static_folder / 'style.css.gz') in created
+    assert gzip.decompress((static_folder / 'style.css.gz').read_bytes()) == CSS
+    assert compress_static_files(str(static_folder)) == []
+    make_stale(static_folder)
+    assert str(static_folder / 'style.css.gz') in compress_static_files(str(static_folder))
+
+
+def test_precompressed_static(app, static_folder):
+    compress_static_files(str(static_folder))
+    client = app.test_client()
+    response = client.get('/static/style.css', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.get_data()) == CSS
+    response.close()
+
+    make_stale(static_folder)
+    response = client.get('/static/style.css', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_data().endswith(b'a { color: red; }\n')
+    response.close()
+
+
+def test_asgi_precompressed_static(static_folder):
+    compress_static_files(str(static_folder))
+    app = Starlette(routes=[Mount('/static', PrecompressedStaticFiles(directory=str(static_folder)))])
+    with TestClient(app) as client:
+        response = client.get('/static/style.css', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['content-encoding'] == 'gzip'
+        assert response.content == CSS
+        make_stale(static_folder)
+        response = client.get('/static/style.css', headers={'Accept-Encoding': 'gzip'})
+        assert 'content-encoding' not in response.headers
+        assert response.content.endswith(b'a { color: red; }\n')
@@ -0,0 +1,84 @@
+import io
+import os
+import pytest
+from werkzeug.datastructures import FileStorage
+from covers import collect_garbage, cover_path, release_cover, store_cover
+from models import db, Book, Cover
+
+
+@pytest.fixture
+def upload_folder(app):
+    os.makedirs(app.config['UPLOAD_FOLDER'])
+    return app.config['UPLOAD_FOLDER']
+
+
+def upload(data):
+    return FileStorage(stream=io.BytesIO(data), filename='cover.jpg', content_type='image/jpeg')
+
+
+def add_book(cover):
+    book = Book(title='t', description='d', year=2000, publisher='p', author='a', pages=1, cover_id=cover.id)
+    db.session.add(book)
+    db.session.flush()
+    return book
+
+
+def test_same_file_is_stored_once(upload_folder):
+    first = store_cover(upload(b'not an image'))
+    db.session.commit()
+    second = store_cover(upload(b'not an image'))
+    assert second.id == first.id
+    assert os.listdir(upload_folder) == [first.filename]
+
+
+def test_file_removed_after_commit_of_last_reference(upload_folder):
+    cover = store_cover(upload(b'cover'))
+    books = [add_book(cover), add_book(cover)]
+    db.session.commit()
+    path = cover_path(cover.filename)
+
+    release_cover(cover, books[0].id)
+    db.session.delete(books[0])
+    db.session.commit()
+    assert db.session.get(Cover, cover.id) is not None
+
+    release_cover(cover, books[1].id)
+    db.session.delete(books[1])
+    assert os.path.exists(path)
+    db.session.commit()
+    assert not os.path.exists(path)
+    assert db.session.scalar(db.select(db.func.count(Cover.id))) == 0
+
+
+def test_new_file_removed_on_rollback(upload_folder):
+    cover = store_cover(upload(b'cover'))
+    path = cover_path(cover.filename)
+    assert os.path.exists(path)
+    db.session.rollback()
+    assert not os.path.exists(path)
+
+
+def test_collect_garbage(upload_folder):
+    used = store_cover(upload(b'used'))
+    add_book(used)
+    orphan = store_cover(upload(b'orphan'))
+    missing = store_cover(upload(b'missing'))
+    add_book(missing)
+    db.session.commit()
+    orphan_id, used_filename = orphan.id, used.filename
+    os.remove(cover_path(missing.filename))
+    with open(cover_path(used.filename), 'ab') as f:
+        f.write(b'changed')
+    stray = os.path.join(upload_folder, 'stray.jpg')
+    with open(stray, 'wb') as f:
+        f.write(b'stray')
+    os.utime(stray, (0, 0))
+
+    report = []
+    assert collect_garbage(dry_run=True, report=report.append)['orphan_rows'] == 1
+    assert db.session.get(Cover, orphan_id) is not None
+
+    stats = collect_garbage(report=report.append)
+    assert stats == {'orphan_rows': 1, 'orphan_files': 1, 'missing_files': 1, 'hash_mismatches': 1, 'checked': 1}
+    assert db.session.get(Cover, orphan_id) is None
+    assert sorted(os.listdir(upload_folder)) == [used_filename]
@@ -0,0 +1,52 @@
+from app import bump_book_versions
+from commands import seed_reference_data
+from fragments import FragmentCache
+from models import db, Book
+
+
+def add_book(title):
+    book = Book(title=title, description='d', year=2000, publisher='p', author='a', pages=1)
+    db.session.add(book)
+    db.session.commit()
+    return book
+
+
+def test_lru_eviction():
+    cache = FragmentCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    cache.clear()
+    assert cache.get('a') is None
+
+
+def test_card_rerendered_after_version_bump(app):
+    client = app.test_client()
+    book = add_book('Старое название')
+    assert 'Старое название' in client.get('/').get_data(as_text=True)
+    book.title = 'Новое название'
+    bump_book_versions([book.id])
+    db.session.commit()
+    html = client.get('/').get_data(as_text=True)
+    assert 'Новое название' in html
+    assert 'Старое название' not in html
+
+
+def test_deleted_book_card_not_reused(app):
+    seed_reference_data()
+    client = app.test_client()
+    assert client.post('/login', data={'username': 'admin', 'password': 'admin'}).status_code == 302
+    first = add_book('Книга A')
+    first_id = first.id
+    assert 'Книга A' in client.get('/').get_data(as_text=True)
+    client.get(f'/book/{first_id}/delete')
+    assert db.session.get(Book, first_id) is None
+
+    second = add_book('Книга B')
+    assert second.id != first_id
+    html = client.get('/').get_data(as_text=True)
+    assert 'Книга B' in html
+    assert 'Книга A' not in html
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta, timezone
+import outbox
+from models import db, OutboxEvent
+from outbox import OutboxConsumer
+
+
+def consume(name):
+    return [[(event.entity, event.entity_id) for event in batch] for batch in OutboxConsumer(name)]
+
+
+def test_consumer_reads_in_batches_and_saves_position(app):
+    for i in range(5):
+        outbox.record('book', i, 'update')
+    db.session.commit()
+    consumer = OutboxConsumer('c1', batch_size=2)
+    assert [len(batch) for batch in consumer] == [2, 2, 1]
+    assert consumer.checkpoint() == db.session.scalar(db.select(db.func.max(OutboxEvent.id)))
+    assert consume('c1') == []
+
+
+def test_prune_respects_slowest_consumer(app):
+    for i in range(3):
+        outbox.record('book', i, 'update')
+    db.session.commit()
+    first = db.session.scalar(db.select(db.func.min(OutboxEvent.id)))
+    OutboxConsumer('fast').ack(first + 2)
+    OutboxConsumer('slow').ack(first)
+    assert outbox.prune() == 1
+    assert consume('slow') == [[('book', 1), ('book', 2)]]
+
+
+def test_prune_without_consumers_deletes_nothing(app):
+    outbox.record('book', 1, 'update')
+    db.session.commit()
+    assert outbox.prune() == 0
+
+
+def test_events_after_full_prune_are_delivered(app):
+    for i in range(3):
+        outbox.record('book', i, 'update')
+    db.session.commit()
+    assert consume('c1') == [[('book', 0), ('book', 1), ('book', 2)]]
+    assert outbox.prune() == 2
+    outbox.record('book', 9, 'insert')
+    db.session.commit()
+    assert consume('c1') == [[('book', 9)]]
+
+
+def test_changes_since(app):
+    outbox.record('book', 1, 'update')
+    outbox.record('cover', 5, 'insert')
+    outbox.record('book', 1, 'update')
+    db.session.commit()
+    position, ids = outbox.changes_since('book', 0)
+    assert ids == [1]
+    assert outbox.changes_since('book', position) == (position, [])
+
+    OutboxConsumer('c1').ack(position)
+    outbox.record('book', 2, 'update')
+    db.session.commit()
+    outbox.prune()
+    assert outbox.changes_since('book', 0) is None
+
+
+def add_event(event_id, entity_id, age=0):
+    """Событие с явным ID, как его записала бы параллельная транзакция на серверной БД."""
+    created_at = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=age)
+    db.session.add(OutboxEvent(id=event_id, entity='book', entity_id=entity_id, op='update', created_at=created_at))
+    db.session.commit()
+
+
+def test_consumer_waits_for_fresh_gap(app):
+    add_event(1, 1)
+    add_event(2, 2)
+    add_event(4, 4)
+    assert consume('c1') == [[('book', 1), ('book', 2)]]
+    assert consume('c1') == []
+    assert outbox.head() == 2
+    assert outbox.changes_since('book', 0) == (2, [1, 2])
+
+    add_event(3, 3)
+    assert consume('c1') == [[('book', 3), ('book', 4)]]
+
+
+def test_old_gap_is_skipped(app):
+    timeout = app.config['OUTBOX_GAP_TIMEOUT']
+    add_event(1, 1)
+    add_event(3, 3, age=3 * timeout)
+    assert consume('c1') == [[('book', 1), ('book', 3)]]
+    assert outbox.head() == 3
+
+
+def test_pruned_ids_are_not_a_gap(app):
+    for i in range(3):
+        add_event(i + 1, i)
+    assert consume('c1') == [[('book', 0), ('book', 1), ('book', 2)]]
+    assert outbox.prune() == 2
+    assert outbox.pruned_through() == 2
+    assert consume('c2') == [[('book', 2)]]
+    assert outbox.head() == 3
@@ -0,0 +1,71 @@
+import threading
+import pytest
+from werkzeug.security import generate_password_hash
+import passwords
+from commands import seed_reference_data
+from models import db, Role
+from passwords import LoginRateLimiter, PasswordHasher, PasswordHasherBusy
+
+
+def test_hit_limits_attempts_per_key(tmp_path):
+    limiter = LoginRateLimiter(str(tmp_path / 'rl.db'), window=300)
+    assert [limiter.hit('user:admin', 3) for _ in range(4)] == [True, True, True, False]
+    assert limiter.hit('user:other', 3)
+
+
+def test_reset_clears_counter(tmp_path):
+    limiter = LoginRateLimiter(str(tmp_path / 'rl.db'), window=300)
+    for _ in range(3):
+        limiter.hit('ip:127.0.0.1', 2)
+    limiter.reset('ip:127.0.0.1')
+    assert limiter.hit('ip:127.0.0.1', 2)
+
+
+def test_counter_expires_with_window(tmp_path, monkeypatch):
+    now = [1_000_000]
+    monkeypatch.setattr(passwords.time, 'time', lambda: now[0])
+    limiter = LoginRateLimiter(str(tmp_path / 'rl.db'), window=300)
+    assert limiter.hit('user:admin', 1)
+    assert not limiter.hit('user:admin', 1)
+    now[0] += 300
+    assert limiter.hit('user:admin', 1)
+
+
+def test_verify_and_update_rehashes_outdated_hash():
+    hasher = PasswordHasher('pbkdf2:sha256:2000', workers=1, queue_size=1, timeout=1)
+    ok, new_hash = hasher.verify_and_update(generate_password_hash('secret', 'pbkdf2:sha256:1000'), 'secret')
+    assert ok and new_hash.startswith('pbkdf2:sha256:2000$')
+    assert hasher.verify_and_update(new_hash, 'secret') == (True, None)
+    assert hasher.verify_and_update(new_hash, 'wrong') == (False, None)
+
+
+def test_hasher_busy_when_queue_is_full():
+    hasher = PasswordHasher('pbkdf2:sha256:1000', workers=1, queue_size=0, timeout=0.01)
+    release = threading.Event()
+    blocker = threading.Thread(target=hasher._submit, args=(release.wait,))
+    blocker.start()
+    try:
+        with pytest.raises(PasswordHasherBusy):
+            hasher.hash('secret')
+    finally:
+        release.set()
+        blocker.join()
+
+
+@pytest.mark.parametrize('url, data', [
+    ('/users/add', {'username': 'new', 'password': 'secret', 'last_name': 'l', 'first_name': 'f'}),
+    ('/users/1/edit', {'password': 'secret', 'last_name': 'l', 'first_name': 'f'}),
+])
+def test_admin_user_forms_return_503_when_busy(app, monkeypatch, url, data):
+    seed_reference_data()
+    client = app.test_client()
+    assert client.post('/login', data={'username': 'admin', 'password': 'admin'}).status_code == 302
+
+    def busy(password):
+        raise PasswordHasherBusy()
+
+    monkeypatch.setattr(app.extensions['password_hasher'], 'hash', busy)
+    data = dict(data, role_id=db.session.scalar(db.select(Role.id).where(Role.name == 'user')))
+    response = client.post(url, data=data)
+    assert response.status_code == 503
+    assert 'Сервер перегружен' in response.get_data(as_text=True)
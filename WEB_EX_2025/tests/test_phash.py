@@ -0,0 +1,111 @@
+import io
+import os
+import pytest
+from PIL import Image, ImageDraw
+from werkzeug.datastructures import FileStorage
+from covers import cover_path, image_signature, merge_near_duplicates, store_cover
+from models import db, Book, Cover
+
+
+@pytest.fixture
+def upload_folder(app):
+    os.makedirs(app.config['UPLOAD_FOLDER'])
+    return app.config['UPLOAD_FOLDER']
+
+
+def encode(image, fmt='JPEG', **params):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+def flat(color, size=(400, 600)):
+    return encode(Image.new('RGB', size, color), quality=90)
+
+
+def text_cover(text):
+    image = Image.new('RGB', (400, 600), 'white')
+    ImageDraw.Draw(image).text((150, 280), text, fill='black')
+    return encode(image, quality=90)
+
+
+def detailed(seed=0, size=(400, 600), **params):
+    image = Image.new('RGB', (400, 600), 'white')
+    draw = ImageDraw.Draw(image)
+    for i in range(12):
+        x, y = (i * 37 + seed * 91) % 300, (i * 53 + seed * 17) % 500
+        color = ((i * 40 + seed * 70) % 255, (i * 90) % 255, (i * 20 + seed * 33) % 255)
+        draw.rectangle([x, y, x + 60 + i * 5, y + 80], fill=color)
+    return encode(image.resize(size), **params)
+
+
+def upload(data):
+    return FileStorage(stream=io.BytesIO(data), filename='cover.jpg', content_type='image/jpeg')
+
+
+def add_book(cover_id):
+    book = Book(title='t', description='d', year=2000, publisher='p', author='a', pages=1, cover_id=cover_id)
+    db.session.add(book)
+    db.session.flush()
+    return book
+
+
+def add_legacy_cover(name, data):
+    cover = Cover(filename=name, mime_type='image/jpeg', md5_hash=name)
+    db.session.add(cover)
+    db.session.flush()
+    with open(cover_path(name), 'wb') as f:
+        f.write(data)
+    return cover.id
+
+
+def test_flat_images_have_no_phash():
+    red, blue = image_signature(io.BytesIO(flat('red'))), image_signature(io.BytesIO(flat('blue')))
+    assert red.phash is None and blue.phash is None
+    assert red.color != blue.color
+    assert red.aspect == 666
+
+
+def test_flat_and_text_covers_are_not_merged(upload_folder):
+    covers = [
+        store_cover(upload(data))
+        for data in (flat('red'), flat('blue'), text_cover('Первая книга'), text_cover('Другая'))
+    ]
+    db.session.commit()
+    assert len({cover.id for cover in covers}) == 4
+    assert len(os.listdir(upload_folder)) == 4
+
+
+def test_recompressed_cover_is_reused(upload_folder):
+    original = store_cover(upload(detailed(quality=90)))
+    db.session.commit()
+    assert original.phash is not None
+
+    assert store_cover(upload(detailed(size=(300, 450), quality=40))).id == original.id
+    assert store_cover(upload(detailed(seed=5, quality=90))).id != original.id
+
+
+def test_same_hash_with_other_colour_or_aspect_is_not_reused(upload_folder):
+    original = store_cover(upload(detailed(quality=90)))
+    db.session.commit()
+    inverted = Image.open(io.BytesIO(detailed(quality=90))).point(lambda value: value // 2)
+    assert store_cover(upload(encode(inverted, quality=90))).id != original.id
+    assert store_cover(upload(detailed(size=(400, 400), quality=90))).id != original.id
+
+
+def test_merge_near_duplicates_skips_flat_covers(upload_folder):
+    ids = [
+        add_legacy_cover('a.jpg', detailed(seed=5, size=(200, 300), quality=30)),
+        add_legacy_cover('b.jpg', detailed(seed=5, quality=70)),
+        add_legacy_cover('red.jpg', flat('red')),
+        add_legacy_cover('blue.jpg', flat('blue')),
+    ]
+    books = [add_book(cover_id).id for cover_id in ids]
+    db.session.commit()
+
+    stats = merge_near_duplicates(6)
+    assert stats['hashed'] == 4
+    assert stats['low_detail'] == 2
+    assert (stats['groups'], stats['merged'], stats['books']) == (1, 1, 1)
+    assert [db.session.get(Book, book_id).cover_id for book_id in books] == [ids[0], ids[0], ids[2], ids[3]]
+    assert sorted(os.listdir(upload_folder)) == ['a.jpg', 'blue.jpg', 'red.jpg']
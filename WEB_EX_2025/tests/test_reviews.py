@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+from app import (REVIEWS_PER_PAGE, parse_review_cursor, review_cursor, split_reviews_page,
+                 approved_reviews_select)
+from commands import seed_reference_data
+from models import db, Book, Review, ReviewStatus, User
+
+
+def test_parse_review_cursor():
+    assert parse_review_cursor('15', 'new') == 15
+    assert parse_review_cursor('4-15', 'rating') == (4, 15)
+    assert parse_review_cursor(None, 'new') is None
+    assert parse_review_cursor(None, 'rating') is None
+    assert parse_review_cursor('abc', 'new') is None
+    assert parse_review_cursor('15', 'rating') is None
+    assert parse_review_cursor('x-1', 'rating') is None
+
+
+def test_review_cursor_roundtrip():
+    review = SimpleNamespace(id=15, rating=4)
+    for sort in ('new', 'rating'):
+        assert parse_review_cursor(review_cursor(review, sort), sort) == (
+            (4, 15) if sort == 'rating' else 15
+        )
+
+
+def test_split_reviews_page():
+    rows = [SimpleNamespace(id=100 - i, rating=5) for i in range(REVIEWS_PER_PAGE + 1)]
+    page, cursor = split_reviews_page(rows, 'new')
+    assert len(page) == REVIEWS_PER_PAGE
+    assert cursor == str(page[-1].id)
+    page, cursor = split_reviews_page(rows[:REVIEWS_PER_PAGE], 'rating')
+    assert len(page) == REVIEWS_PER_PAGE
+    assert cursor is None
+
+
+def test_keyset_pages_cover_all_reviews(app):
+    seed_reference_data()
+    statuses = dict(db.session.execute(db.select(ReviewStatus.name, ReviewStatus.id)).all())
+    book = Book(title='t', description='d', year=2000, publisher='p', author='a', pages=1)
+    db.session.add(book)
+    db.session.flush()
+    role_id = db.session.scalar(db.select(User.role_id))
+    total = REVIEWS_PER_PAGE * 2 + 5
+    for i in range(total + 3):
+        user = User(username=f'u{i}', password_hash='x', last_name='l', first_name='f', role_id=role_id)
+        db.session.add(user)
+        db.session.flush()
+        status = statuses['approved'] if i < total else statuses['pending']
+        db.session.add(Review(book_id=book.id, user_id=user.id, rating=i % 5 + 1, text='r', status_id=status))
+    db.session.commit()
+
+    for sort in ('new', 'rating'):
+        seen, after = [], None
+        while True:
+            page, cursor = split_reviews_page(db.session.scalars(
+                approved_reviews_select(book.id, sort, after).limit(REVIEWS_PER_PAGE + 1)
+            ).all(), sort)
+            seen.extend(page)
+            if cursor is None:
+                break
+            after = parse_review_cursor(cursor, sort)
+        assert len(seen) == total
+        assert len({review.id for review in seen}) == total
+        if sort == 'rating':
+            keys = [(review.rating, review.id) for review in seen]
+        else:
+            keys = [review.id for review in seen]
+        assert keys == sorted(keys, reverse=True)
@@ -0,0 +1,100 @@
+import sqlite3
+from collections import namedtuple
+from app import create_app
+from models import db, Book
+from suggest import SuggestIndex, normalize
+
+BookRow = namedtuple('BookRow', 'id title author')
+
+
+def make_index():
+    index = SuggestIndex()
+    index.build([
+        BookRow(1, 'Мастер и Маргарита', 'Михаил Булгаков'),
+        BookRow(2, 'Собачье сердце', 'Михаил Булгаков'),
+        BookRow(3, 'Ёжик в тумане', 'Сергей Козлов'),
+    ], position=7)
+    return index
+
+
+def ids(results):
+    return [item['id'] for item in results]
+
+
+def test_normalize():
+    assert normalize('  Ёжик   В  Тумане ') == 'ежик в тумане'
+    assert normalize(None) == ''
+
+
+def test_build_sets_position():
+    index = make_index()
+    assert index.ready
+    assert index.position == 7
+
+
+def test_search_by_prefix_of_any_word():
+    index = make_index()
+    assert ids(index.search('мастер')) == [1]
+    assert ids(index.search('маргар')) == [1]
+    assert ids(index.search('ежик')) == [3]
+    assert sorted(ids(index.search('булгаков'))) == [1, 2]
+
+
+def test_search_deduplicates_and_limits():
+    index = make_index()
+    assert ids(index.search('михаил', limit=1)) in ([1], [2])
+    assert sorted(ids(index.search('м'))) == [1, 2]
+    assert index.search('   ') == []
+
+
+def test_add_replaces_old_keys():
+    index = make_index()
+    index.add(BookRow(2, 'Роковые яйца', 'Михаил Булгаков'))
+    assert index.search('собач') == []
+    assert ids(index.search('роков')) == [2]
+    index.add(BookRow(4, 'Белая гвардия', 'Михаил Булгаков'))
+    assert sorted(ids(index.search('булгаков'))) == [1, 2, 4]
+
+
+def test_remove():
+    index = make_index()
+    index.remove(1)
+    index.remove(42)
+    assert index.search('мастер') == []
+    assert ids(index.search('булгаков')) == [2]
+
+
+def test_apply_removes_missing_books():
+    index = make_index()
+    index.apply(10, [2, 3], [BookRow(2, 'Собачье сердце', 'М. А. Булгаков')])
+    assert index.search('ежик') == []
+    assert ids(index.search('м. а.')) == [2]
+    assert index.position == 10
+
+
+def make_app(tmp_path, uri):
+    return create_app(
+        SQLALCHEMY_DATABASE_URI=uri,
+        RATE_LIMIT_DB=str(tmp_path / 'ratelimit.db'),
+        JINJA_BYTECODE_CACHE_DIR=str(tmp_path / 'jinja_cache')
+    )
+
+
+def test_create_app_without_outbox_table(tmp_path):
+    """Фабрика не падает на базе, ещё не обновлённой до журнала outbox (flask db upgrade)."""
+    path = tmp_path / 'old.db'
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE books (id INTEGER PRIMARY KEY, title TEXT, author TEXT)')
+    assert not make_app(tmp_path, f'sqlite:///{path}').extensions['suggest_index'].ready
+
+
+def test_create_app_preloads_index(tmp_path):
+    uri = f'sqlite:///{tmp_path / "exam.db"}'
+    with make_app(tmp_path, uri).app_context():
+        db.create_all()
+        db.session.add(Book(title='Мастер и Маргарита', description='d', year=1967, publisher='p',
+                            author='Михаил Булгаков', pages=1))
+        db.session.commit()
+    index = make_app(tmp_path, uri).extensions['suggest_index']
+    assert index.ready
+    assert [item['id'] for item in index.search('мастер')] == [1]
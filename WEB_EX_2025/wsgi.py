@@ -0,0 +1,7 @@
+"""
+Точка входа для WSGI-серверов (gunicorn, PythonAnywhere): `wsgi:app`.
+"""
+
+from app import create_app
+
+app = create_app()